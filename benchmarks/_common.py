@@ -0,0 +1,61 @@
+# Copyright 2017 Xaptum, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License
+
+
+"""Helpers shared by the benchmark scripts in this directory."""
+
+from __future__ import absolute_import, division, print_function
+
+import codecs
+import os
+import sys
+import timeit
+
+# Run from a source checkout without installing
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from cryptography.hazmat import backends
+from cryptography.hazmat.primitives.asymmetric import ec
+
+def make_group(id='bench'):
+    """Returns a fresh encoded 'id,public,private' DAA group, including the
+    private key so a *StandInServer* can use it.
+
+    """
+    key = ec.generate_private_key(ec.SECP256R1(), backends.default_backend())
+    public = codecs.encode(key.public_key().public_numbers().encode_point(), 'hex')
+    return '%s,%s,%x'%(id, public.decode('ascii'), key.private_numbers().private_value)
+
+def per_call(fn, min_time=0.2, repeat=3):
+    """Returns the best seconds per call of *fn* over *repeat* runs of at least
+    *min_time* seconds each.
+
+    """
+    timer = timeit.Timer(fn)
+    (number, _) = timer.autorange() if hasattr(timer, 'autorange') else (1000, None)
+    while timer.timeit(number) < min_time:
+        number *= 2
+    return min(timer.repeat(repeat, number)) / number
+
+def percentile(values, q):
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+def row(label, value, unit=''):
+    print("%-40s %12s %s"%(label, value, unit))
+
+def us(seconds):
+    return '%.1f'%(seconds * 1e6)
@@ -0,0 +1,57 @@
+# Copyright 2017 Xaptum, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License
+
+
+"""Encode/decode throughput of the XDAA wire codec.
+
+Times building each message into a buffer and parsing it back with the cached
+*struct.Struct* headers and memoryview fields, without any crypto.
+
+    python benchmarks/bench_codec.py
+
+"""
+
+from __future__ import absolute_import, division, print_function
+
+from _common import make_group, per_call, row
+
+from xaptum.xdaa import xdaa
+from xaptum.xdaa.xdaa import (client_hello, client_key_exchange, client_params,
+                              server_key_exchange)
+
+def parse(cls, buf):
+    msg = cls.parse_header(buf)
+    return msg.parse_body(memoryview(buf)[cls.header_len:])
+
+def main():
+    group  = xdaa.parse_group(make_group())
+    client = client_params.initialize(group)
+    server = client_params.initialize(group)
+
+    hello    = client_hello.build_from_params(client)
+    exchange = server_key_exchange.build_from_params(server, hello)
+    reply    = client_key_exchange.build_from_params(client, server)
+
+    for (name, cls, msg) in (("ClientHello", client_hello, hello),
+                             ("ServerKeyExchange", server_key_exchange, exchange),
+                             ("ClientKeyExchange", client_key_exchange, reply)):
+        buf = msg.buffer
+        out = bytearray(len(buf))
+        encode = per_call(lambda: msg.write_into(out))
+        decode = per_call(lambda: parse(cls, buf))
+        row("%s encode (%d bytes)"%(name, len(buf)), '%.0f'%(1 / encode), "msg/s")
+        row("%s decode"%name, '%.0f'%(1 / decode), "msg/s")
+
+if __name__ == '__main__':
+    main()
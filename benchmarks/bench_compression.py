@@ -0,0 +1,93 @@
+# Copyright 2017 Xaptum, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License
+
+
+"""Compression ratio against CPU cost for DDS payload compression.
+
+Compresses a stream of synthetic JSON telemetry messages of several sizes in
+each *DeflateCompressor* mode and reports the compressed size as a fraction
+of the original, and the time to compress and to decompress one message.
+The preset dictionary is built from messages generated apart from the ones
+measured.
+
+    python benchmarks/bench_compression.py [--messages N]
+
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import argparse
+import json
+import random
+
+from _common import row
+from xaptum.dds.compression import DeflateCompressor, DeflateDecompressor
+from xaptum.xdaa.util import monotonic
+
+SIZES = (64, 256, 1024, 4096)
+
+MODES = (("per message", False, False),
+         ("per message + dictionary", False, True),
+         ("persistent", True, False),
+         ("persistent + dictionary", True, True))
+
+def telemetry(rand, size):
+    """Returns one JSON message of about *size* bytes."""
+    message = {'device': 'sensor-%04d'%rand.randrange(1000),
+               'timestamp': 1500000000 + rand.randrange(10 ** 6),
+               'readings': []}
+    while len(json.dumps(message)) < size:
+        message['readings'].append({'temperature': round(rand.uniform(15, 30), 2),
+                                    'humidity': round(rand.uniform(30, 60), 1),
+                                    'status': rand.choice(['ok', 'ok', 'ok', 'degraded'])})
+    return json.dumps(message).encode('ascii')
+
+def measure(messages, dictionary, persistent):
+    compressor   = DeflateCompressor(dictionary, persistent)
+    decompressor = DeflateDecompressor(dictionary, persistent)
+
+    start = monotonic()
+    payloads = [compressor.compress(message) for message in messages]
+    compress = (monotonic() - start) / len(messages)
+
+    start = monotonic()
+    for payload in payloads:
+        if payload is not None:
+            decompressor.decompress(payload)
+    decompress = (monotonic() - start) / len(messages)
+
+    original = sum(len(message) for message in messages)
+    sent = sum(len(message if payload is None else payload)
+               for (message, payload) in zip(messages, payloads))
+    return (sent / original, compress, decompress)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--messages', type=int, default=2000,
+                        help="messages per size and mode (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    rand = random.Random(1)
+    dictionary = b''.join(telemetry(rand, 512) for _ in range(16))[-32768:]
+    for size in SIZES:
+        messages = [telemetry(rand, size) for _ in range(args.messages)]
+        print("%d byte messages"%size)
+        for (name, persistent, use_dictionary) in MODES:
+            (ratio, compress, decompress) = measure(messages, dictionary if use_dictionary else b'',
+                                                    persistent)
+            row("  " + name, '%.3f'%ratio,
+                "of original  compress %5.1f us  decompress %5.1f us"%(compress * 1e6, decompress * 1e6))
+
+if __name__ == '__main__':
+    main()
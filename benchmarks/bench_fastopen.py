@@ -0,0 +1,136 @@
+# Copyright 2017 Xaptum, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License
+
+
+"""Round trip saved by sending the ClientHello in the SYN with TCP Fast Open.
+
+Runs sequential handshakes against an in-process *StandInServer* listening
+with Fast Open, with and without *fast_open*, and reports for each:
+
+  * p50/p99 time until the XDAA secret is negotiated, which takes two round
+    trips without Fast Open and one with it
+  * the smoothed RTT the kernel measured and how many SYNs carried the hello
+
+    python benchmarks/bench_fastopen.py [--count N] [--tls]
+
+Loopback RTTs are tens of microseconds, so the saving is lost in the noise
+unless latency is added, e.g. 25 ms each way:
+
+    tc qdisc add dev lo root netem delay 25ms
+    tc qdisc del dev lo root
+
+Linux only sends or accepts data in the SYN when net.ipv4.tcp_fastopen has
+bits 1 (client) and 2 (server) set:
+
+    sysctl -w net.ipv4.tcp_fastopen=3
+
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import argparse
+import socket
+import struct
+
+from _common import make_group, percentile, row
+
+from xaptum import client, xdaa
+from xaptum.client.client import fast_open_connection
+from xaptum.client.standin import StandInServer
+from xaptum.xdaa.util import monotonic
+
+# struct tcp_info from linux/tcp.h
+TCP_INFO_SIZE     = 104
+TCPI_OPTIONS      = 5
+TCPI_RTT          = 68
+TCPI_OPT_SYN_DATA = 0x20
+
+def tcp_info(sock):
+    """Returns whether the SYN carried accepted data and the smoothed RTT in
+    seconds.
+
+    """
+    info = sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_INFO, TCP_INFO_SIZE)
+    (options,) = struct.unpack_from('B', info, TCPI_OPTIONS)
+    (rtt,) = struct.unpack_from('I', info, TCPI_RTT)
+    return (bool(options & TCPI_OPT_SYN_DATA), rtt / 1e6)
+
+def xdaa_only(address, group, fast_open):
+    """Returns the raw socket, twice to match *with_tls*."""
+    if fast_open:
+        handshake = xdaa.client_handshake(group)
+        sock = fast_open_connection(address, handshake.start())
+        xdaa.complete_handshake(sock, handshake)
+    else:
+        sock = socket.create_connection(address)
+        xdaa.negotiate_secret(sock, group)
+    return (sock, sock)
+
+def with_tls(address, group, fast_open):
+    """Returns a duplicate of the raw socket for TCP_INFO and the TLS socket."""
+    sock = client.connect(address[0], address[1], group, fast_open=fast_open)
+    return (socket.fromfd(sock.fileno(), sock.family, sock.type), sock)
+
+def sequential(address, group, count, fast_open, handshake):
+    """Returns the latencies, RTTs and number of SYNs that carried the hello."""
+    latencies = []
+    rtts = []
+    syn_data = 0
+    for _ in range(count):
+        start = monotonic()
+        (raw, sock) = handshake(address, group, fast_open)
+        latencies.append(monotonic() - start)
+        (accepted, rtt) = tcp_info(raw)
+        syn_data += accepted
+        rtts.append(rtt)
+        if raw is not sock:
+            raw.close()
+        sock.close()
+    return (latencies, rtts, syn_data)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--count', type=int, default=200,
+                        help="sequential handshakes to time per mode (default: %(default)s)")
+    parser.add_argument('--tls', action='store_true',
+                        help="time the full connect including TLS-PSK, not only XDAA")
+    args = parser.parse_args(argv)
+
+    if not hasattr(socket, 'MSG_FASTOPEN'):
+        parser.exit(1, "TCP Fast Open is not available on this platform\n")
+
+    handshake = with_tls if args.tls else xdaa_only
+    group = make_group()
+    with StandInServer(group, tls=args.tls, handler=lambda conn: None,
+                       backlog=1024, fast_open=True) as server:
+        # The first Fast Open connection only fetches the server's cookie
+        for sock in set(handshake(server.address, group, True)):
+            sock.close()
+
+        p50 = {}
+        for fast_open in (False, True):
+            (latencies, rtts, syn_data) = sequential(server.address, group, args.count,
+                                                     fast_open, handshake)
+            p50[fast_open] = percentile(latencies, 0.50)
+            print("%s (%d)"%("fast open" if fast_open else "plain connect", args.count))
+            row("  p50", '%.2f'%(1000 * p50[fast_open]), "ms")
+            row("  p99", '%.2f'%(1000 * percentile(latencies, 0.99)), "ms")
+            row("  RTT p50", '%.2f'%(1000 * percentile(rtts, 0.50)), "ms")
+            row("  hello carried in SYN", '%d/%d'%(syn_data, args.count))
+
+        print("saved by fast open")
+        row("  p50", '%.2f'%(1000 * (p50[False] - p50[True])), "ms")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+# Copyright 2017 Xaptum, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License
+
+
+"""Per-handshake cost of DAA group parsing and ECDSA algorithm objects.
+
+Compares parsing the encoded group on every handshake with the cached
+*parse_group*, and allocating *ECDSA(SHA256())* per sign/verify with the
+shared instance in *xaptum.xdaa.secp256r1*.
+
+    python benchmarks/bench_group_cache.py
+
+"""
+
+from __future__ import absolute_import, division, print_function
+
+from _common import make_group, per_call, row, us
+
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import ec
+from xaptum.xdaa import xdaa
+
+def main():
+    group  = make_group()
+    parsed = xdaa.parse_group(group)
+    key    = parsed.private
+    sig    = key.sign_sha256(b'message')
+
+    uncached = per_call(lambda: xdaa.daa_group.from_encoded(group))
+    cached   = per_call(lambda: xdaa.parse_group(group))
+    row("parse group, every handshake", us(uncached), "us")
+    row("parse_group, cached", us(cached), "us")
+
+    fresh_sign  = per_call(lambda: key._sign(b'message', ec.ECDSA(hashes.SHA256())))
+    shared_sign = per_call(lambda: key.sign_sha256(b'message'))
+    row("sign, ECDSA object per call", us(fresh_sign), "us")
+    row("sign, shared ECDSA object", us(shared_sign), "us")
+
+    fresh_verify  = per_call(lambda: parsed.public._verify(sig, b'message', ec.ECDSA(hashes.SHA256())))
+    shared_verify = per_call(lambda: parsed.public.verify_sha256(sig, b'message'))
+    row("verify, ECDSA object per call", us(fresh_verify), "us")
+    row("verify, shared ECDSA object", us(shared_verify), "us")
+
+    saved = (uncached - cached) + (fresh_sign - shared_sign) + (fresh_verify - shared_verify)
+    row("saved per handshake", us(saved), "us")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+# Copyright 2017 Xaptum, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License
+
+
+"""Handshake latency, throughput and crypto cost over loopback.
+
+Runs *connect* against an in-process *StandInServer* and reports:
+
+  * p50/p99 latency of sequential handshakes, overall and per phase
+  * handshakes/sec with *connect_many* at several concurrency levels
+  * the cost of each crypto step of the client side on its own
+
+    python benchmarks/bench_handshake.py [--count N] [--concurrency 1,8,32] [--no-tls]
+
+The server runs in the same process, so its work competes for the GIL and the
+throughput figures are a lower bound.
+
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import argparse
+import os
+import socket
+
+from _common import make_group, percentile, per_call, row, us
+
+from xaptum import client, xdaa
+from xaptum.client.standin import StandInServer
+from xaptum.xdaa import trace, x25519
+from xaptum.xdaa.util import monotonic
+
+def sequential(address, group, count, tls):
+    """Returns the per-connection latencies and a tracer with the phases."""
+    tracer = xdaa.HistogramTracer()
+    latencies = []
+    for _ in range(count):
+        start = monotonic()
+        if tls:
+            sock = client.connect(address[0], address[1], group, tracer=tracer)
+        else:
+            sock = socket.create_connection(address)
+            xdaa.negotiate_secret(sock, group, tracer=tracer)
+        latencies.append(monotonic() - start)
+        sock.close()
+    return (latencies, tracer)
+
+def crypto_steps(group):
+    parsed = xdaa.parse_group(group)
+    peer   = x25519.key_pair()
+    mine   = x25519.key_pair()
+    sig    = parsed.private.sign_sha256(b'\0' * 100)
+    return [("x25519 key pair", lambda: x25519.key_pair()),
+            ("nonce", lambda: os.urandom(32)),
+            ("ECDSA verify (ServerKeyExchange)", lambda: parsed.public.verify_sha256(sig, b'\0' * 100)),
+            ("ECDSA sign (ClientKeyExchange)", lambda: parsed.private.sign_sha256(b'\0' * 100)),
+            ("x25519 shared secret", lambda: mine.compute_shared(peer.public))]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--count', type=int, default=200,
+                        help="sequential handshakes to time (default: %(default)s)")
+    parser.add_argument('--concurrency', default='1,8,32',
+                        help="comma-separated connect_many concurrency levels (default: %(default)s)")
+    parser.add_argument('--no-tls', dest='tls', action='store_false',
+                        help="time the XDAA exchange only, without TLS-PSK")
+    args = parser.parse_args(argv)
+
+    group = make_group()
+    with StandInServer(group, tls=args.tls, handler=lambda conn: None, backlog=1024) as server:
+        (latencies, tracer) = sequential(server.address, group, args.count, args.tls)
+        print("sequential handshakes (%d)"%args.count)
+        row("  p50", '%.2f'%(1000 * percentile(latencies, 0.50)), "ms")
+        row("  p99", '%.2f'%(1000 * percentile(latencies, 0.99)), "ms")
+        for phase in (trace.TCP_CONNECT, trace.INITIALIZE, trace.CLIENT_HELLO,
+                      trace.SERVER_KEY_EXCHANGE, trace.VERIFY_SIGNATURE, trace.SIGN,
+                      trace.CLIENT_KEY_EXCHANGE, trace.COMPUTE_SHARED, trace.TLS_HANDSHAKE):
+            stats = tracer.stats(phase)
+            if stats is not None:
+                row("  %s mean"%phase, us(stats.mean), "us")
+
+        if args.tls:
+            print("concurrent handshakes")
+            for concurrency in [int(n) for n in args.concurrency.split(',')]:
+                results = client.connect_many([server.address] * args.count, group,
+                                              concurrency=concurrency)
+                for result in results:
+                    if result.ok:
+                        result.sock.close()
+                row("  concurrency %d"%concurrency, '%.0f'%results.handshakes_per_sec, "handshakes/s")
+
+    print("client crypto steps")
+    for (name, step) in crypto_steps(group):
+        row("  " + name, us(per_call(step)), "us")
+
+if __name__ == '__main__':
+    main()
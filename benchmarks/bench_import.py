@@ -0,0 +1,74 @@
+# Copyright 2017 Xaptum, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License
+
+
+"""Cold-start cost of importing the package.
+
+Starts a fresh interpreter for each sample and reports the median time of
+each import beyond a bare interpreter start, and whether the heavy
+dependencies were loaded by it. The *first use* rows also touch an attribute,
+which loads the lazily exported modules.
+
+    python benchmarks/bench_import.py [--runs N]
+
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import argparse
+import os
+import subprocess
+import sys
+
+from _common import percentile, row
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+
+HEAVY = ('ssl', 'sslpsk', 'donna25519', 'cryptography')
+
+CASES = (("import xaptum", "import xaptum"),
+         ("import xaptum.dds", "import xaptum.dds"),
+         ("import xaptum.xdaa", "import xaptum.xdaa"),
+         ("import xaptum.client", "import xaptum.client"),
+         ("first use of xaptum.xdaa", "import xaptum.xdaa; xaptum.xdaa.negotiate_secret"),
+         ("first use of xaptum.client", "import xaptum.client; xaptum.client.connect"))
+
+PROBE = '''
+import sys, time
+start = time.time()
+%s
+elapsed = time.time() - start
+print(elapsed, ','.join(m for m in %r if m in sys.modules))
+'''
+
+def sample(statement):
+    env = dict(os.environ, PYTHONPATH=os.path.abspath(ROOT))
+    out = subprocess.check_output([sys.executable, '-c', PROBE%(statement, HEAVY)], env=env)
+    (elapsed, loaded) = (out.decode('ascii').strip().split(' ') + [''])[:2]
+    return (float(elapsed), loaded)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--runs', type=int, default=15,
+                        help="interpreters started per case (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    for (name, statement) in CASES:
+        samples = [sample(statement) for _ in range(args.runs)]
+        elapsed = percentile([s[0] for s in samples], 0.5)
+        loaded  = samples[-1][1] or '-'
+        row(name, '%.1f'%(1000 * elapsed), "ms  loads: %s"%loaded)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+# Copyright 2017 Xaptum, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License
+
+
+"""Resident memory per established connection.
+
+Opens *--connections* connections to a *StandInServer* running in a child
+process and holds them, then reports the growth of the client's resident set
+and of the Python heap (tracemalloc) per connection. The XDAA-only row keeps
+just the plain socket and shared secret, the TLS row the full *connect*
+result.
+
+    python benchmarks/bench_memory.py [--connections N]
+
+Needs Linux for /proc/self/statm and Python 3.4+ for tracemalloc.
+
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import argparse
+import gc
+import multiprocessing
+import os
+import socket
+import tracemalloc
+
+from _common import make_group, row
+
+from xaptum import client, xdaa
+from xaptum.client.standin import StandInServer, discard
+
+def serve(group, tls, addresses, stop):
+    with StandInServer(group, tls=tls, handler=discard, backlog=1024) as server:
+        addresses.put(server.address)
+        stop.wait()
+
+def resident_bytes():
+    with open('/proc/self/statm') as statm:
+        return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+def measure(group, tls, count):
+    addresses = multiprocessing.Queue()
+    stop = multiprocessing.Event()
+    server = multiprocessing.Process(target=serve, args=(group, tls, addresses, stop))
+    server.start()
+    (host, port) = addresses.get()
+
+    # Warm up imports, caches and allocator pools before the baseline
+    held = [open_one(host, port, group, tls) for _ in range(10)]
+    gc.collect()
+    rss = resident_bytes()
+    tracemalloc.start()
+    heap = tracemalloc.get_traced_memory()[0]
+
+    held += [open_one(host, port, group, tls) for _ in range(count)]
+    gc.collect()
+    heap = (tracemalloc.get_traced_memory()[0] - heap) / count
+    rss = (resident_bytes() - rss) / count
+    tracemalloc.stop()
+
+    for conn in held:
+        conn[0].close()
+    stop.set()
+    server.join()
+    return (rss, heap)
+
+def open_one(host, port, group, tls):
+    if tls:
+        return (client.connect(host, port, group),)
+    sock = socket.create_connection((host, port))
+    return (sock, xdaa.negotiate_secret(sock, group))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--connections', type=int, default=400,
+                        help="connections to hold open (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    group = make_group()
+    xdaa.parse_group(group)
+    for (name, tls) in (("XDAA only", False), ("XDAA + TLS-PSK", True)):
+        (rss, heap) = measure(group, tls, args.connections)
+        row("%s resident"%name, '%.0f'%rss, "bytes/connection")
+        row("%s Python heap"%name, '%.0f'%heap, "bytes/connection")
+
+if __name__ == '__main__':
+    main()
@@ -45,5 +45,10 @@ setup(
                 'xaptum.xdaa'],
     install_requires = ['cryptography>=1.9',
                         'donna25519>=0.1.1',
-                        'sslpsk>=1.0']
+                        'futures>=3.0; python_version < "3.2"',
+                        'selectors34>=1.2; python_version < "3.4"',
+                        'sslpsk==1.0.0'],
+    entry_points = {
+        'console_scripts': ['xaptum-loadgen = xaptum.client.loadgen:main']
+        }
     )
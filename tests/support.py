@@ -0,0 +1,30 @@
+# Copyright 2017 Xaptum, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License
+
+
+from __future__ import absolute_import, print_function
+
+import codecs
+
+from cryptography.hazmat import backends
+from cryptography.hazmat.primitives.asymmetric import ec
+
+def make_group(id='test'):
+    """Returns a fresh encoded 'id,public,private' DAA group, including the
+    private key so a *StandInServer* can use it.
+
+    """
+    key = ec.generate_private_key(ec.SECP256R1(), backends.default_backend())
+    public = codecs.encode(key.public_key().public_numbers().encode_point(), 'hex')
+    return '%s,%s,%x'%(id, public.decode('ascii'), key.private_numbers().private_value)
@@ -0,0 +1,167 @@
+# Copyright 2017 Xaptum, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License
+
+
+from __future__ import absolute_import, print_function
+
+import random
+import socket
+import threading
+import unittest
+
+from xaptum import dds
+from xaptum.dds.dds import frame_into, frame_len, header_len
+from xaptum.dds.reader import frame_decoder
+
+def encode(messages):
+    """Returns the frames for the (topic, payload) pairs in *messages*."""
+    encoded = [(topic.encode('utf-8'), payload) for (topic, payload) in messages]
+    buf = bytearray(sum(frame_len(topic, payload) for (topic, payload) in encoded))
+    offset = 0
+    for (topic, payload) in encoded:
+        offset = frame_into(buf, offset, topic, payload)
+    return bytes(buf)
+
+def messages(count, max_size, seed=3):
+    rand = random.Random(seed)
+    return [('t%d'%(i % 3), bytes(bytearray(rand.randrange(256) for _ in range(rand.randint(0, max_size)))))
+            for i in range(count)]
+
+def readings():
+    return [('t', ('{"sensor": %d, "value": 1}'%i).encode('ascii')) for i in range(100)]
+
+def drain(decoder):
+    return [(frame.topic, frame.payload.tobytes()) for frame in decoder.frames()]
+
+class FrameDecoderTest(unittest.TestCase):
+
+    def test_byte_at_a_time(self):
+        sent = messages(20, 50)
+        data = encode(sent)
+        decoder = frame_decoder()
+        received = []
+        for i in range(len(data)):
+            self.assertEqual(decoder.feed(data[i:i + 1]), 1)
+            received.extend(drain(decoder))
+        self.assertEqual(received, sent)
+        self.assertEqual(decoder.pending, 0)
+
+    def test_compaction(self):
+        # Frames of up to 40 bytes through a 48 byte buffer, fed in uneven
+        # pieces, so most frames straddle the end and must be moved back
+        sent = messages(200, 40 - header_len - 2)
+        data = encode(sent)
+        decoder = frame_decoder(max_frame_size=40, buffer_size=48)
+        rand = random.Random(5)
+        received = []
+        while data:
+            taken = decoder.feed(data[:rand.randint(1, 30)])
+            data = data[taken:]
+            received.extend(drain(decoder))
+        self.assertEqual(received, sent)
+
+    def test_writable_makes_room_for_the_next_frame(self):
+        data = encode([('a', b'x' * 15), ('b', b'y' * 15)])
+        decoder = frame_decoder(max_frame_size=32, buffer_size=32)
+        first = frame_len(b'a', b'x' * 15)
+        split = first + header_len
+        self.assertEqual(decoder.feed(data[:split]), split)
+        self.assertEqual(len(drain(decoder)), 1)
+        # The second frame's header says it would run past the end, so the
+        # header moves to the front
+        self.assertEqual(len(decoder.writable()), 32 - header_len)
+        decoder.feed(data[split:])
+        self.assertEqual(drain(decoder), [('b', b'y' * 15)])
+
+    def test_full_buffer_takes_nothing(self):
+        decoder = frame_decoder(max_frame_size=32, buffer_size=32)
+        data = encode([('a', b'x' * 10), ('b', b'y' * 10)])
+        self.assertEqual(decoder.feed(data), 32)
+        self.assertEqual(decoder.feed(data[32:]), 0)
+        self.assertEqual(len(drain(decoder)), 1)
+        self.assertEqual(decoder.feed(data[32:]), len(data) - 32)
+        self.assertEqual(drain(decoder), [('b', b'y' * 10)])
+
+    def test_frame_too_large(self):
+        decoder = frame_decoder(max_frame_size=64, buffer_size=64)
+        decoder.feed(encode([('t', b'x' * 64)])[:header_len])
+        self.assertRaises(dds.DDSFrameTooLargeError, drain, decoder)
+
+    def test_unsupported_version(self):
+        data = bytearray(encode([('t', b'x')]))
+        data[0] = dds.dds.version + 1
+        decoder = frame_decoder()
+        decoder.feed(data)
+        self.assertRaises(dds.DDSUnsupportedVersionError, drain, decoder)
+
+class DDSReaderTest(unittest.TestCase):
+
+    def setUp(self):
+        (self.a, self.b) = socket.socketpair()
+
+    def tearDown(self):
+        self.a.close()
+        self.b.close()
+
+    def read_all(self, **kwargs):
+        return [(frame.topic, bytes(bytearray(frame.payload)))
+                for frame in dds.DDSReader(self.b, **kwargs)]
+
+    def test_eof_between_frames(self):
+        self.a.sendall(encode([('t', b'one'), ('t', b'two')]))
+        self.a.shutdown(socket.SHUT_WR)
+        self.assertEqual(self.read_all(), [('t', b'one'), ('t', b'two')])
+
+    def test_eof_mid_frame(self):
+        data = encode([('t', b'one'), ('t', b'two')])
+        self.a.sendall(data[:-1])
+        self.a.shutdown(socket.SHUT_WR)
+        reader = iter(dds.DDSReader(self.b))
+        self.assertEqual(next(reader).topic, 't')
+        self.assertRaises(dds.DDSError, next, reader)
+
+    def test_frame_too_large(self):
+        self.a.sendall(encode([('t', b'x' * 100)]))
+        self.a.shutdown(socket.SHUT_WR)
+        self.assertRaises(dds.DDSFrameTooLargeError, self.read_all, max_frame_size=64)
+
+    def round_trip(self, sent, **kwargs):
+        def write():
+            with dds.DDSWriter(self.a, flush_size=1024, **kwargs) as writer:
+                for (topic, payload) in sent:
+                    writer.write(payload, topic)
+            self.a.shutdown(socket.SHUT_WR)
+        thread = threading.Thread(target=write)
+        thread.start()
+        try:
+            received = self.read_all(max_frame_size=8192, buffer_size=2048)
+        finally:
+            thread.join()
+        self.assertEqual(received, sent)
+
+    def test_round_trip(self):
+        # Includes payloads larger than the writer's buffer, sent unbuffered
+        self.round_trip(messages(300, 3000))
+
+    def test_round_trip_without_timed_flush(self):
+        self.round_trip(messages(50, 100), max_delay=None)
+
+    def test_round_trip_compressed(self):
+        self.round_trip(readings(), compression=dds.DeflateCompressor())
+
+    def test_round_trip_compressed_persistent(self):
+        self.round_trip(readings(), compression=dds.DeflateCompressor(persistent=True))
+
+if __name__ == '__main__':
+    unittest.main()
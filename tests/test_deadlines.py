@@ -0,0 +1,211 @@
+# Copyright 2017 Xaptum, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License
+
+
+from __future__ import absolute_import, print_function
+
+import socket
+import threading
+import time
+import unittest
+
+from tests.support import make_group
+from xaptum import xdaa
+from xaptum.client import client
+from xaptum.client.standin import StandInServer, discard
+from xaptum.xdaa import trace
+
+GROUP = make_group()
+
+# Generous next to the phase budgets, so a stall is what fails the test
+SHORT = 0.3
+LONG  = 10.0
+
+class trickle(object):
+    """Sends one byte at a time, *delay* seconds apart."""
+
+    def __init__(self, sock, delay):
+        self.sock = sock
+        self.delay = delay
+
+    def recv_into(self, *args):
+        return self.sock.recv_into(*args)
+
+    def sendall(self, data):
+        for i in range(len(data)):
+            self.sock.sendall(data[i:i + 1])
+            time.sleep(self.delay)
+
+class listener(object):
+    """Accepts connections and passes each to *handle* on its own thread, or
+    never accepts them if *handle* is None. With *backlog* 0 and one pending
+    connection, later connects stall in the TCP handshake.
+
+    """
+
+    def __init__(self, handle=None, backlog=8):
+        self.handle = handle
+        self.conns = []
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._sock.bind(('127.0.0.1', 0))
+        self._sock.listen(backlog)
+        self._thread = None
+        if handle is not None:
+            self._thread = threading.Thread(target=self._serve)
+            self._thread.daemon = True
+            self._thread.start()
+
+    @property
+    def address(self):
+        return self._sock.getsockname()[:2]
+
+    def close(self):
+        try:
+            self._sock.shutdown(socket.SHUT_RDWR)
+        except socket.error:
+            pass
+        self._sock.close()
+        if self._thread is not None:
+            self._thread.join()
+        for conn in self.conns:
+            conn.close()
+
+    def _serve(self):
+        while True:
+            try:
+                (conn, _) = self._sock.accept()
+            except (socket.error, OSError):
+                return
+            self.conns.append(conn)
+            thread = threading.Thread(target=self._run, args=(conn,))
+            thread.daemon = True
+            thread.start()
+
+    def _run(self, conn):
+        try:
+            self.handle(conn)
+        except Exception:
+            pass
+
+def trickle_server_key_exchange(conn):
+    xdaa.accept_secret(trickle(conn, 0.05), GROUP)
+
+def close_after_hello(conn):
+    conn.recv(65536)
+    conn.close()
+
+class ConnectDeadlineTest(unittest.TestCase):
+
+    def setUp(self):
+        self.servers = []
+
+    def tearDown(self):
+        for server in self.servers:
+            server.close()
+
+    def serve(self, handle=None, backlog=8):
+        server = listener(handle, backlog)
+        self.servers.append(server)
+        return server.address
+
+    def stalled_connect(self):
+        # The one pending connection fills the accept queue
+        address = self.serve(backlog=0)
+        self.addCleanup(socket.create_connection(address).close)
+        return address
+
+    def assertTimesOut(self, phase, address, **kwargs):
+        start = time.time()
+        with self.assertRaises(xdaa.XDAATimeoutError) as caught:
+            client.connect(address[0], address[1], GROUP, **kwargs).close()
+        self.assertEqual(caught.exception.phase, phase)
+        self.assertLess(time.time() - start, LONG / 2)
+
+    def test_timeout_connect(self):
+        self.assertTimesOut(trace.TCP_CONNECT, self.stalled_connect(), timeout=SHORT)
+
+    def test_timeout_server_key_exchange(self):
+        self.assertTimesOut(trace.SERVER_KEY_EXCHANGE, self.serve(), timeout=SHORT)
+
+    def test_timeout_holds_across_partial_reads(self):
+        self.assertTimesOut(trace.SERVER_KEY_EXCHANGE,
+                            self.serve(trickle_server_key_exchange), timeout=SHORT)
+
+    def test_phase_connect(self):
+        self.assertTimesOut(trace.TCP_CONNECT, self.stalled_connect(),
+                            phase_timeouts={trace.TCP_CONNECT: SHORT}, timeout=LONG)
+
+    def test_phase_server_key_exchange(self):
+        self.assertTimesOut(trace.SERVER_KEY_EXCHANGE, self.serve(trickle_server_key_exchange),
+                            phase_timeouts={trace.SERVER_KEY_EXCHANGE: SHORT}, timeout=LONG)
+
+    def test_phase_tls_handshake(self):
+        with StandInServer(GROUP, tls=False, handler=discard) as server:
+            self.assertTimesOut(trace.TLS_HANDSHAKE, server.address,
+                                phase_timeouts={trace.TLS_HANDSHAKE: SHORT}, timeout=LONG)
+
+    def test_overall_timeout_cuts_phase_budget(self):
+        self.assertTimesOut(trace.SERVER_KEY_EXCHANGE, self.serve(),
+                            phase_timeouts={trace.SERVER_KEY_EXCHANGE: LONG}, timeout=SHORT)
+
+    def test_peer_close_is_not_a_timeout(self):
+        address = self.serve(close_after_hello)
+        with self.assertRaises(xdaa.XDAAError) as caught:
+            client.connect(address[0], address[1], GROUP, timeout=LONG).close()
+        self.assertIsInstance(caught.exception, xdaa.XDAASocketClosedError)
+        self.assertNotIsInstance(caught.exception, xdaa.XDAATimeoutError)
+        self.assertFalse(issubclass(xdaa.XDAATimeoutError, xdaa.XDAASocketClosedError))
+
+    def test_returned_socket_is_blocking(self):
+        with StandInServer(GROUP) as server:
+            sock = client.connect(server.address[0], server.address[1], GROUP, timeout=LONG,
+                                  phase_timeouts={trace.TLS_HANDSHAKE: LONG})
+            try:
+                self.assertIsNone(sock.gettimeout())
+            finally:
+                sock.close()
+
+@unittest.skipUnless(hasattr(socket, 'MSG_FASTOPEN'), "platform has no TCP Fast Open")
+class FastOpenDeadlineTest(ConnectDeadlineTest):
+
+    def assertTimesOut(self, phase, address, **kwargs):
+        super(FastOpenDeadlineTest, self).assertTimesOut(phase, address, fast_open=True, **kwargs)
+
+class NegotiateSecretTimeoutTest(unittest.TestCase):
+
+    def setUp(self):
+        (self.sock, self.peer) = socket.socketpair()
+        self.sock.settimeout(7.0)
+
+    def tearDown(self):
+        self.sock.close()
+        self.peer.close()
+
+    def test_timeout_restores_previous(self):
+        with self.assertRaises(xdaa.XDAATimeoutError) as caught:
+            xdaa.negotiate_secret(self.sock, GROUP, timeout=SHORT)
+        self.assertEqual(caught.exception.phase, trace.SERVER_KEY_EXCHANGE)
+        self.assertEqual(self.sock.gettimeout(), 7.0)
+
+    def test_success_restores_previous(self):
+        thread = threading.Thread(target=xdaa.accept_secret, args=(self.peer, GROUP))
+        thread.start()
+        try:
+            self.assertEqual(len(xdaa.negotiate_secret(self.sock, GROUP, timeout=LONG)), 32)
+        finally:
+            thread.join()
+        self.assertEqual(self.sock.gettimeout(), 7.0)
+
+if __name__ == '__main__':
+    unittest.main()
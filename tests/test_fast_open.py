@@ -0,0 +1,121 @@
+# Copyright 2017 Xaptum, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License
+
+
+from __future__ import absolute_import, print_function
+
+import socket
+import struct
+import unittest
+
+from tests.support import make_group
+from xaptum import xdaa
+from xaptum.xdaa import util
+from xaptum.client import client
+from xaptum.client.standin import StandInServer
+
+GROUP = make_group()
+
+TCPI_OPT_SYN_DATA = 0x20
+
+def syn_data_accepted(sock):
+    """Returns whether the peer acknowledged data sent in the SYN (Linux)."""
+    info = sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_INFO, 104)
+    return bool(struct.unpack_from('B', info, 5)[0] & TCPI_OPT_SYN_DATA)
+
+def fast_open_enabled():
+    # Bit 1 enables Fast Open for clients, bit 2 for servers
+    try:
+        with open('/proc/sys/net/ipv4/tcp_fastopen') as f:
+            return int(f.read()) & 3 == 3
+    except (IOError, OSError, ValueError):
+        return False
+
+def echo_once(sock, data):
+    sock.sendall(data)
+    return util.recvexactly(sock, len(data))
+
+@unittest.skipUnless(hasattr(socket, 'MSG_FASTOPEN'), "platform has no TCP Fast Open")
+class FastOpenTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = StandInServer(GROUP, tls=False, fast_open=True)
+        self.server.start()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def handshake(self):
+        handshake = xdaa.client_handshake(GROUP)
+        sock = client.fast_open_connection(self.server.address, handshake.start())
+        secret = xdaa.complete_handshake(sock, handshake)
+        return (sock, secret)
+
+    def test_handshake(self):
+        for _ in range(3):
+            (sock, secret) = self.handshake()
+            try:
+                self.assertEqual(len(secret), 32)
+                self.assertEqual(echo_once(sock, b'ping'), b'ping')
+            finally:
+                sock.close()
+
+    @unittest.skipUnless(fast_open_enabled(), "net.ipv4.tcp_fastopen does not enable client and server")
+    def test_hello_in_syn(self):
+        # The first connection fetches the cookie, later ones carry data
+        (sock, _) = self.handshake()
+        sock.close()
+        (sock, _) = self.handshake()
+        try:
+            self.assertTrue(syn_data_accepted(sock))
+        finally:
+            sock.close()
+
+    def test_timeout(self):
+        handshake = xdaa.client_handshake(GROUP)
+        sock = client.fast_open_connection(self.server.address, handshake.start(), 5.0)
+        try:
+            self.assertEqual(sock.gettimeout(), 5.0)
+            self.assertEqual(len(xdaa.complete_handshake(sock, handshake)), 32)
+        finally:
+            sock.close()
+
+    def test_fallback_without_msg_fastopen(self):
+        flag = socket.MSG_FASTOPEN
+        del socket.MSG_FASTOPEN
+        try:
+            (sock, secret) = self.handshake()
+        finally:
+            socket.MSG_FASTOPEN = flag
+        try:
+            self.assertEqual(len(secret), 32)
+            self.assertFalse(syn_data_accepted(sock))
+        finally:
+            sock.close()
+
+@unittest.skipUnless(hasattr(socket, 'MSG_FASTOPEN'), "platform has no TCP Fast Open")
+class FastOpenConnectTest(unittest.TestCase):
+
+    def test_connect(self):
+        with StandInServer(GROUP, fast_open=True) as server:
+            (host, port) = server.address
+            for _ in range(2):
+                sock = client.connect(host, port, GROUP, fast_open=True)
+                try:
+                    self.assertEqual(echo_once(sock, b'ping'), b'ping')
+                finally:
+                    sock.close()
+
+if __name__ == '__main__':
+    unittest.main()
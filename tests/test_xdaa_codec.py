@@ -0,0 +1,154 @@
+# Copyright 2017 Xaptum, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License
+
+
+from __future__ import absolute_import, print_function
+
+import random
+import socket
+import threading
+import unittest
+
+from tests.support import make_group
+from xaptum import xdaa
+from xaptum.xdaa import util
+from xaptum.xdaa.xdaa import (client_hello, client_key_exchange, client_params,
+                              server_key_exchange)
+
+GROUP = make_group()
+
+def parse(cls, buf):
+    msg = cls.parse_header(buf)
+    return msg.parse_body(memoryview(buf)[cls.header_len:])
+
+def server_reply(handshake):
+    """Returns the ClientHello *handshake* sends and a valid ServerKeyExchange
+    answering it.
+
+    """
+    hello  = parse(client_hello, handshake.start())
+    server = client_params.initialize(xdaa.parse_group(GROUP))
+    return (hello, server_key_exchange.build_from_params(server, hello).buffer)
+
+class RoundTripTest(unittest.TestCase):
+
+    def test_client_hello(self):
+        params = client_params.initialize(xdaa.parse_group(GROUP))
+        msg = client_hello.build_from_params(params)
+        parsed = parse(client_hello, msg.buffer)
+        self.assertEqual(parsed.version, 0)
+        self.assertEqual(parsed.group_id, 'test')
+        self.assertEqual(parsed.nonce.tobytes(), params.nonce)
+
+    def test_server_key_exchange(self):
+        (hello, buf) = server_reply(xdaa.client_handshake(GROUP))
+        parsed = parse(server_key_exchange, buf)
+        self.assertEqual(parsed.group_id, 'test')
+        self.assertEqual(parsed.ecdhe_public_key_len, 32)
+        self.assertEqual(parsed.header_len + parsed.body_len, len(buf))
+        out = bytearray(len(buf))
+        self.assertEqual(parsed.write_into(out), len(buf))
+        self.assertEqual(out, buf)
+
+    def test_client_key_exchange(self):
+        handshake = xdaa.client_handshake(GROUP)
+        (_, buf) = server_reply(handshake)
+        reply = handshake.receive_data(buf)
+        parsed = parse(client_key_exchange, reply)
+        self.assertEqual(parsed.ecdhe_public_key_len, 32)
+        self.assertEqual(parsed.header_len + parsed.body_len, len(reply))
+
+    def test_byte_at_a_time(self):
+        handshake = xdaa.client_handshake(GROUP)
+        (_, buf) = server_reply(handshake)
+        replies = [handshake.receive_data(buf[i:i + 1]) for i in range(len(buf))]
+        self.assertTrue(handshake.done)
+        self.assertFalse(any(replies[:-1]))
+        self.assertTrue(replies[-1])
+
+    def test_negotiate_and_accept_agree(self):
+        (a, b) = socket.socketpair()
+        server = {}
+        thread = threading.Thread(target=lambda: server.setdefault('secret', xdaa.accept_secret(b, GROUP)))
+        thread.start()
+        try:
+            secret = xdaa.negotiate_secret(a, GROUP)
+        finally:
+            thread.join()
+            a.close()
+            b.close()
+        self.assertEqual(secret, server['secret'])
+        self.assertEqual(len(secret), 32)
+
+    def test_recvexactly_returns_bytes(self):
+        (a, b) = socket.socketpair()
+        try:
+            a.sendall(b'abcdef')
+            self.assertEqual(util.recvexactly(b, 4), b'abcd')
+            self.assertIsInstance(util.recvexactly(b, 2), bytes)
+            a.close()
+            self.assertEqual(util.recvexactly(b, 1), b'')
+        finally:
+            a.close()
+            b.close()
+
+class FuzzTest(unittest.TestCase):
+    """Malformed ServerKeyExchanges must fail with *XDAAError* and nothing else."""
+
+    iterations = 300
+
+    def feed(self, handshake, data):
+        try:
+            handshake.receive_data(data)
+        except xdaa.XDAAError:
+            pass
+
+    def test_mutated(self):
+        rand = random.Random(7)
+        for _ in range(self.iterations):
+            handshake = xdaa.client_handshake(GROUP)
+            (_, buf) = server_reply(handshake)
+            for _ in range(rand.randint(1, 4)):
+                buf[rand.randrange(len(buf))] = rand.randrange(256)
+            self.feed(handshake, buf)
+
+    def test_truncated(self):
+        rand = random.Random(11)
+        for _ in range(self.iterations):
+            handshake = xdaa.client_handshake(GROUP)
+            (_, buf) = server_reply(handshake)
+            self.feed(handshake, buf[:rand.randrange(len(buf))])
+            self.assertFalse(handshake.done)
+
+    def test_random(self):
+        rand = random.Random(13)
+        for _ in range(self.iterations):
+            handshake = xdaa.client_handshake(GROUP)
+            handshake.start()
+            size = rand.randint(0, 300)
+            self.feed(handshake, bytearray(rand.randrange(256) for _ in range(size)))
+
+    def test_non_ascii_group_id(self):
+        handshake = xdaa.client_handshake(GROUP)
+        (_, buf) = server_reply(handshake)
+        buf[server_key_exchange.header_len] = 0xff
+        self.assertRaises(xdaa.XDAAError, handshake.receive_data, buf)
+
+    def test_trailing_data(self):
+        handshake = xdaa.client_handshake(GROUP)
+        (_, buf) = server_reply(handshake)
+        self.assertRaises(xdaa.XDAAError, handshake.receive_data, buf + b'x')
+
+if __name__ == '__main__':
+    unittest.main()
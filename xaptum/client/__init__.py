@@ -14,4 +14,33 @@
 
 from __future__ import absolute_import, print_function
 
-from xaptum.client.client import connect
+import importlib
+import sys
+
+# Loaded on first use, since they pull in ssl, sslpsk and the XDAA crypto
+_exports = {'connect'             : 'xaptum.client.client',
+            'connect_many'        : 'xaptum.client.bulk',
+            'Multiplexer'         : 'xaptum.client.multiplexer',
+            'MetricsRegistry'     : 'xaptum.client.metrics',
+            'ConnectionPool'      : 'xaptum.client.pool',
+            'EndpointStats'       : 'xaptum.client.race',
+            'connect_racing'      : 'xaptum.client.race',
+            'ResilientConnection' : 'xaptum.client.resilient',
+            'SessionCache'        : 'xaptum.client.session'}
+
+if sys.version_info >= (3, 5):
+    _exports['connect_async'] = 'xaptum.client.aio'
+
+if sys.version_info >= (3, 7):
+    def __getattr__(name):
+        if name not in _exports:
+            raise AttributeError("module %r has no attribute %r"%(__name__, name))
+        value = getattr(importlib.import_module(_exports[name]), name)
+        globals()[name] = value
+        return value
+
+    def __dir__():
+        return sorted(set(globals()) | set(_exports))
+else:
+    for (_name, _module) in _exports.items():
+        globals()[_name] = getattr(importlib.import_module(_module), _name)
@@ -0,0 +1,96 @@
+# Copyright 2017 Xaptum, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License
+
+
+from __future__ import absolute_import, print_function
+
+import asyncio
+import ssl
+
+from xaptum import xdaa
+from xaptum.client import psk
+from xaptum.client.client import default_ciphers, default_ssl_version
+
+class _sslpsk_context(ssl.SSLContext):
+    """An *ssl.SSLContext* that installs an sslpsk client callback on every SSL
+    object it creates, which is how asyncio runs TLS.
+
+    """
+
+    def wrap_bio(self, *args, **kwargs):
+        sslobj = super(_sslpsk_context, self).wrap_bio(*args, **kwargs)
+        psk.set_client_psk(sslobj, self.psk_callback)
+        return sslobj
+
+def psk_context(shared_secret, ciphers=default_ciphers, ssl_version=default_ssl_version):
+    """Returns an *ssl.SSLContext* that authenticates with the given XDAA shared
+    secret as the TLS pre-shared key, for use with asyncio.
+
+    Uses the TLS-PSK support in the *ssl* module on Python 3.13+ and sslpsk on
+    older versions.
+
+    """
+    if hasattr(ssl.SSLContext, 'set_psk_client_callback'):
+        context = psk.context(ciphers, ssl_version)
+        context.set_psk_client_callback(lambda hint: ('x', shared_secret))
+        return context
+
+    context = _sslpsk_context(ssl_version)
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+    context.set_ciphers(ciphers)
+    context.psk_callback = lambda hint: (shared_secret, 'x')
+    return context
+
+async def connect_async(host, port, daa_group, ciphers=default_ciphers, ssl_version=default_ssl_version,
+                        key_pool=None):
+    """Establishes a connection to the Xaptum ENF without blocking the event loop.
+
+    Returns a *(reader, writer)* pair of asyncio streams running over the
+    TLS-PSK transport. *daa_group* and *key_pool* are as for *connect*.
+
+    Raises *OSError* on underlying socket errors, *ssl.SSLError* on underlying
+    SSL errors, and *xaptum.xdaa.XDAAError* on errors during the XDAA secret
+    negotiation.
+
+    """
+
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        secret  = await xdaa.negotiate_secret_async(reader, writer, daa_group, key_pool=key_pool)
+        context = psk_context(secret, ciphers=ciphers, ssl_version=ssl_version)
+        if hasattr(writer, 'start_tls'):
+            await writer.start_tls(context, server_hostname=None)
+        else:
+            reader, writer = await _start_tls_detached(writer, context)
+    except BaseException:
+        writer.close()
+        raise
+    #TODO perform DDS authentication
+
+    return reader, writer
+
+async def _start_tls_detached(writer, context):
+    # Before Python 3.11 a stream cannot be upgraded to TLS in place. Hand a
+    # duplicate of the socket to a new TLS connection and drop the old
+    # transport, which closes only the original descriptor. The server sends
+    # nothing between the ClientKeyExchange and the TLS handshake, so no data
+    # is left behind in the old reader.
+    sock = writer.get_extra_info('socket').dup()
+    writer.transport.abort()
+    try:
+        return await asyncio.open_connection(sock=sock, ssl=context, server_hostname='')
+    except BaseException:
+        sock.close()
+        raise
@@ -0,0 +1,103 @@
+# Copyright 2017 Xaptum, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License
+
+
+from __future__ import absolute_import, division, print_function
+
+from collections import namedtuple
+from concurrent import futures
+from xaptum import xdaa
+from xaptum.client.client import connect
+from xaptum.xdaa.util import monotonic
+
+class connect_result(namedtuple('connect_result', ['endpoint',
+                                                   'sock',
+                                                   'error',
+                                                   'duration'])):
+    __slots__ = ()
+
+    @property
+    def ok(self):
+        return self.error is None
+
+class connect_many(object):
+    """Connects to many endpoints concurrently on a thread pool.
+
+    *endpoints* is an iterable of (host, port) pairs. Each one is connected
+    with *xaptum.client.connect* using the shared *daa_group*, which is parsed
+    once up front. Remaining keyword arguments are passed to *connect*.
+
+    Iterating yields a *connect_result* per endpoint in completion order.
+    Failures are reported in *connect_result.error* rather than raised.
+    Afterwards, *succeeded*, *failed*, *elapsed* and *handshakes_per_sec*
+    summarize the run. If iteration stops early, connects not yet started are
+    cancelled and connections not yet yielded are closed.
+
+        results = connect_many(endpoints, group, concurrency=64)
+        for result in results:
+            ...
+        print(results.handshakes_per_sec)
+
+    """
+
+    def __init__(self, endpoints, daa_group, concurrency=16, **connect_kwargs):
+        self.endpoints = list(endpoints)
+        self.concurrency = concurrency
+        self.succeeded = 0
+        self.failed = 0
+        self.elapsed = 0.0
+        self._group = xdaa.parse_group(daa_group)
+        self._connect_kwargs = connect_kwargs
+
+    @property
+    def handshakes_per_sec(self):
+        if self.elapsed <= 0:
+            return 0.0
+        return self.succeeded / self.elapsed
+
+    def _connect(self, endpoint):
+        (host, port) = endpoint
+        start = monotonic()
+        try:
+            sock = connect(host, port, self._group, **self._connect_kwargs)
+        except Exception as e:
+            return connect_result(endpoint, None, e, monotonic() - start)
+        return connect_result(endpoint, sock, None, monotonic() - start)
+
+    def __iter__(self):
+        start = monotonic()
+        executor = futures.ThreadPoolExecutor(max_workers=self.concurrency)
+        pending = set(executor.submit(self._connect, endpoint) for endpoint in self.endpoints)
+        try:
+            for future in futures.as_completed(list(pending)):
+                pending.discard(future)
+                result = future.result()
+                if result.ok:
+                    self.succeeded += 1
+                else:
+                    self.failed += 1
+                self.elapsed = monotonic() - start
+                yield result
+        finally:
+            # Stopped early: skip connects not yet started and close the
+            # sockets of those still running once they finish.
+            for future in pending:
+                if not future.cancel():
+                    future.add_done_callback(_close_result)
+            executor.shutdown(wait=not pending)
+
+def _close_result(future):
+    sock = future.result().sock
+    if sock is not None:
+        sock.close()
@@ -14,33 +14,250 @@
 
 from __future__ import absolute_import, print_function
 
+import errno
+import os
+import select
 import socket
 import ssl
-import sslpsk
 
 from xaptum import xdaa
+from xaptum.client import psk
+from xaptum.xdaa import trace
+from xaptum.xdaa import util
+from xaptum.xdaa.util import monotonic
 
 default_ciphers     = "PSK-AES256-GCM-SHA384:PSK-AES256-CBC-SHA"
 default_ssl_version = ssl.PROTOCOL_TLSv1_2
 
-def secure_socket(sock, shared_secret, ciphers=default_ciphers, ssl_version=default_ssl_version):
-    return sslpsk.wrap_socket(sock,
-                              psk=(shared_secret, 'x'),
-                              ciphers=ciphers,
-                              ssl_version=ssl_version)
+# Errors meaning the kernel or platform cannot do TCP Fast Open, as opposed
+# to the peer being unreachable.
+_fast_open_unsupported = (errno.EOPNOTSUPP, errno.ENOPROTOOPT, errno.EINVAL)
 
-def connect(host, port, daa_group, ciphers=default_ciphers, ssl_version=default_ssl_version):
+def fast_open_connection(address, data, timeout=None):
+    """Connects to *address* with *data* carried in the SYN by TCP Fast Open,
+    saving a round trip before the peer sees it, and returns the socket.
+
+    If the kernel has no Fast Open cookie for the peer yet, *data* follows the
+    handshake as usual. Where Fast Open is unavailable, this falls back to
+    *socket.create_connection* and *sendall*. Either way, all of *data* has
+    been sent on return. *timeout* is set on the socket as with
+    *socket.create_connection*, and Nagle's algorithm is disabled.
+
+    Raises *socket.error* on underlying socket errors.
+
+    """
+    flag = getattr(socket, 'MSG_FASTOPEN', None)
+    if flag is None:
+        return _plain_connection(address, data, timeout)
+
+    (host, port) = address
+    error = None
+    for (family, type, proto, _, sockaddr) in socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM):
+        sock = socket.socket(family, type, proto)
+        if timeout is not None:
+            sock.settimeout(timeout)
+        try:
+            util.set_nodelay(sock)
+            sent = _send_fast_open(sock, data, flag, sockaddr, timeout)
+            if sent < len(data):
+                sock.sendall(memoryview(data)[sent:])
+            return sock
+        except socket.error as e:
+            sock.close()
+            if e.errno in _fast_open_unsupported:
+                return _plain_connection(address, data, timeout)
+            error = e
+    if error is None:
+        error = socket.error("getaddrinfo returned an empty list")
+    raise error
+
+def _send_fast_open(sock, data, flag, sockaddr, timeout):
+    try:
+        sent = sock.sendto(data, flag, sockaddr)
+    except socket.error as e:
+        if e.errno != errno.EINPROGRESS:
+            raise
+        sent = 0
+    if timeout is None:
+        return sent
+    # With a timeout the socket is non-blocking, so sendto returns before the
+    # connection is up, having sent or queued the data or, without a cookie,
+    # left it to follow. Wait for the connection as *create_connection* would,
+    # so a stalled connect is not mistaken for a slow reply.
+    (_, writable, _) = select.select([], [sock], [], timeout)
+    if not writable:
+        raise socket.timeout("timed out")
+    error = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+    if error:
+        raise socket.error(error, os.strerror(error))
+    return sent
+
+def _plain_connection(address, data, timeout):
+    if timeout is None:
+        sock = socket.create_connection(address)
+    else:
+        sock = socket.create_connection(address, timeout)
+    try:
+        util.set_nodelay(sock)
+        sock.sendall(data)
+    except Exception:
+        sock.close()
+        raise
+    return sock
+
+def secure_socket(sock, shared_secret, ciphers=default_ciphers, ssl_version=default_ssl_version,
+                  session_cache=None, endpoint=None):
+    if session_cache is None:
+        context = psk.context(ciphers, ssl_version)
+        session = None
+    else:
+        # Resumption needs a context shared across connections
+        context = session_cache.context(ciphers, ssl_version)
+        session = session_cache.get(endpoint)
+
+    # Wrapping detaches *sock*, so from here on only tlssock can close it
+    tlssock = context.wrap_socket(sock, do_handshake_on_connect=False)
+    try:
+        psk.set_client_psk(tlssock, lambda hint: (shared_secret, 'x'))
+        if session is not None:
+            tlssock.session = session
+        tlssock.do_handshake()
+    except Exception:
+        tlssock.close()
+        raise
+
+    if session_cache is not None:
+        session_cache.update(endpoint, tlssock)
+    return tlssock
+
+def connect(host, port, daa_group, ciphers=default_ciphers, ssl_version=default_ssl_version,
+            key_pool=None, tracer=None, session_cache=None, metrics=None, fast_open=False,
+            timeout=None, phase_timeouts=None):
     """Establishes a connection to the Xaptum ENF.
 
+    *daa_group* is either an *xaptum.xdaa.daa_group* or its encoded
+    'id,public,private' string. Parse it once with *xaptum.xdaa.parse_group*
+    to share the keys across many connections. An optional
+    *xaptum.xdaa.EphemeralKeyPool* supplies pre-generated ephemeral keys, and an
+    optional *xaptum.xdaa.Tracer* receives the duration of each phase. With a
+    *SessionCache*, the TLS handshake tries to resume the last session with
+    this endpoint before falling back to a full handshake. With a
+    *MetricsRegistry*, the handshake outcome is recorded and the returned
+    socket is wrapped to count its traffic. With *fast_open*, the ClientHello
+    is sent in the SYN using TCP Fast Open where the platform supports it.
+
+    *timeout* bounds the whole connection setup in seconds. *phase_timeouts*
+    maps the phases *xaptum.xdaa.trace.TCP_CONNECT*, *SERVER_KEY_EXCHANGE* and
+    *TLS_HANDSHAKE* to their own budgets, each also cut short by *timeout*.
+    The deadlines hold across partial reads, so a server trickling bytes
+    cannot stall the caller. The returned socket is blocking.
+
     Raises *socket.error* on underlying socket errors, *ssl.SSLError* on
-    underlying SSL socket errors, and *xaptum.xdaa.XDAAError* on errors during
-    the XDAA secret negotiation.
+    underlying SSL socket errors, *xaptum.xdaa.XDAATimeoutError* when a
+    deadline passes, and *xaptum.xdaa.XDAAError* on errors during the XDAA
+    secret negotiation.
 
     """
+    deadlines = _deadlines(timeout, phase_timeouts)
+
+    if metrics is None:
+        return _connect(host, port, daa_group, ciphers, ssl_version,
+                        key_pool, tracer, session_cache, fast_open, deadlines)
+
+    metrics.handshakes_started.inc()
+    start = monotonic()
+    try:
+        tlssock = _connect(host, port, daa_group, ciphers, ssl_version,
+                           key_pool, tracer, session_cache, fast_open, deadlines)
+    except Exception as e:
+        metrics.handshake_failed(e)
+        raise
+    metrics.handshake_duration.observe(monotonic() - start)
+    metrics.handshakes_completed.inc()
+    return metrics.instrument(tlssock)
+
+class _deadlines(object):
+    """The overall deadline and per-phase budgets of one *connect*."""
+
+    def __init__(self, timeout, phase_timeouts):
+        self.enabled = timeout is not None or bool(phase_timeouts)
+        self.overall = None if timeout is None else monotonic() + timeout
+        self.budgets = phase_timeouts or {}
+
+    def start(self, phase):
+        """Returns the deadline for *phase* starting now, or None."""
+        budget = self.budgets.get(phase)
+        if budget is None:
+            return self.overall
+        deadline = monotonic() + budget
+        if self.overall is None:
+            return deadline
+        return min(deadline, self.overall)
+
+    def remaining(self, phase, deadline):
+        try:
+            return None if deadline is None else util.remaining(deadline)
+        except socket.timeout:
+            raise xdaa.XDAATimeoutError("Timed out before %s"%phase, phase)
 
-    tcpsock = socket.create_connection((host, port))
-    secret  = xdaa.negotiate_secret(tcpsock, daa_group)
-    tlssock = secure_socket(tcpsock, secret, ciphers=ciphers, ssl_version=default_ssl_version)
+def _connect(host, port, daa_group, ciphers, ssl_version, key_pool, tracer, session_cache,
+             fast_open, deadlines):
+    if fast_open:
+        handshake = xdaa.client_handshake(daa_group, key_pool=key_pool, tracer=tracer)
+        hello     = handshake.start()
+
+    if tracer is not None:
+        mark = monotonic()
+
+    # TCP
+    deadline = deadlines.start(trace.TCP_CONNECT)
+    timeout  = deadlines.remaining(trace.TCP_CONNECT, deadline)
+    try:
+        if fast_open:
+            tcpsock = fast_open_connection((host, port), hello, timeout)
+        elif timeout is None:
+            tcpsock = socket.create_connection((host, port))
+        else:
+            tcpsock = socket.create_connection((host, port), timeout)
+    except socket.timeout:
+        raise xdaa.XDAATimeoutError("Timed out connecting to %s:%d"%(host, port),
+                                    trace.TCP_CONNECT)
+    if tracer is not None:
+        mark = trace.trace(tracer, trace.TCP_CONNECT, mark)
+    if deadlines.enabled:
+        tcpsock.settimeout(None)
+
+    try:
+        util.set_nodelay(tcpsock)
+
+        # XDAA
+        deadline = deadlines.start(trace.SERVER_KEY_EXCHANGE)
+        if not fast_open:
+            handshake = xdaa.client_handshake(daa_group, key_pool=key_pool, tracer=tracer)
+            try:
+                util.sendall(tcpsock, handshake.start(), deadline)
+            except socket.timeout:
+                raise xdaa.XDAATimeoutError("Timed out sending ClientHello", trace.CLIENT_HELLO)
+        secret = xdaa.complete_handshake(tcpsock, handshake, deadline)
+        if tracer is not None:
+            mark = monotonic()
+
+        # TLS
+        deadline = deadlines.start(trace.TLS_HANDSHAKE)
+        if deadlines.enabled:
+            tcpsock.settimeout(deadlines.remaining(trace.TLS_HANDSHAKE, deadline))
+        try:
+            tlssock = secure_socket(tcpsock, secret, ciphers=ciphers, ssl_version=ssl_version,
+                                    session_cache=session_cache, endpoint=(host, port))
+        except socket.timeout:
+            raise xdaa.XDAATimeoutError("Timed out in TLS handshake", trace.TLS_HANDSHAKE)
+        if tracer is not None:
+            trace.trace(tracer, trace.TLS_HANDSHAKE, mark)
+        if deadlines.enabled:
+            tlssock.settimeout(None)
+    except Exception:
+        tcpsock.close()
+        raise
     #TODO perform DDS authentication
-    
+
     return tlssock
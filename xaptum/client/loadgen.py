@@ -0,0 +1,173 @@
+# Copyright 2017 Xaptum, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License
+
+
+"""Simulates a fleet of devices connecting to the ENF, or to a local stand-in.
+
+Devices are spread over a pool of processes. Each process connects its share
+of devices concurrently with *connect_many* and then sends fixed-size messages
+from every device at the requested per-device rate. The per-process statistics
+are merged into one report.
+
+"""
+
+from __future__ import absolute_import, division, print_function
+
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+
+from xaptum.xdaa.util import monotonic
+
+def _percentile(values, q):
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+def _run_devices(options):
+    """Runs *devices* simulated devices in this process and returns their
+    statistics.
+
+    """
+    from xaptum.client.bulk import connect_many
+
+    (host, port, group, devices, rate, duration, message_size, concurrency) = options
+    stats = {'connected'       : 0,
+             'failed'          : 0,
+             'connect_latency' : [],
+             'send_latency'    : [],
+             'messages'        : 0,
+             'bytes'           : 0,
+             'send_errors'     : 0,
+             'elapsed'         : 0.0}
+
+    socks = []
+    for result in connect_many([(host, port)] * devices, group, concurrency=concurrency):
+        stats['connect_latency'].append(result.duration)
+        if result.ok:
+            stats['connected'] += 1
+            socks.append(result.sock)
+        else:
+            stats['failed'] += 1
+
+    payload = os.urandom(message_size)
+    start = monotonic()
+    tick = 0
+    while socks and monotonic() - start < duration:
+        for sock in list(socks):
+            sent = monotonic()
+            try:
+                sock.sendall(payload)
+            except Exception:
+                stats['send_errors'] += 1
+                socks.remove(sock)
+                sock.close()
+                continue
+            stats['send_latency'].append(monotonic() - sent)
+            stats['messages'] += 1
+            stats['bytes'] += message_size
+        tick += 1
+        delay = start + tick / rate - monotonic()
+        if delay > 0:
+            time.sleep(delay)
+    stats['elapsed'] = monotonic() - start
+
+    for sock in socks:
+        sock.close()
+    return stats
+
+def _merge(results):
+    merged = {'connected'       : 0,
+              'failed'          : 0,
+              'connect_latency' : [],
+              'send_latency'    : [],
+              'messages'        : 0,
+              'bytes'           : 0,
+              'send_errors'     : 0,
+              'elapsed'         : 0.0}
+    for stats in results:
+        for key in ('connected', 'failed', 'messages', 'bytes', 'send_errors'):
+            merged[key] += stats[key]
+        merged['connect_latency'].extend(stats['connect_latency'])
+        merged['send_latency'].extend(stats['send_latency'])
+        merged['elapsed'] = max(merged['elapsed'], stats['elapsed'])
+    return merged
+
+def report(stats, out=sys.stdout):
+    elapsed = stats['elapsed'] or float('nan')
+    connects = stats['connect_latency']
+    sends = stats['send_latency']
+    print("devices connected   %d (%d failed)"%(stats['connected'], stats['failed']), file=out)
+    print("connect latency     p50 %.1f ms  p99 %.1f ms  max %.1f ms"%
+          (1000 * _percentile(connects, 0.50),
+           1000 * _percentile(connects, 0.99),
+           1000 * (max(connects) if connects else float('nan'))), file=out)
+    print("messages sent       %d (%d send errors)"%(stats['messages'], stats['send_errors']), file=out)
+    print("throughput          %.1f msg/s  %.1f KiB/s"%
+          (stats['messages'] / elapsed, stats['bytes'] / elapsed / 1024), file=out)
+    print("send latency        p50 %.3f ms  p99 %.3f ms"%
+          (1000 * _percentile(sends, 0.50),
+           1000 * _percentile(sends, 0.99)), file=out)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='xaptum-loadgen', description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--host', default='127.0.0.1', help="target host")
+    parser.add_argument('--port', type=int, default=443, help="target port")
+    parser.add_argument('--group', default=os.environ.get('XAPTUM_GROUP'),
+                        help="encoded DAA group 'id,public,private' (default: $XAPTUM_GROUP)")
+    parser.add_argument('--standin', action='store_true',
+                        help="start a local stand-in server and target it instead of --host/--port")
+    parser.add_argument('--devices', type=int, default=100, help="number of simulated devices")
+    parser.add_argument('--processes', type=int, default=multiprocessing.cpu_count(),
+                        help="number of worker processes")
+    parser.add_argument('--concurrency', type=int, default=32,
+                        help="concurrent connects per process")
+    parser.add_argument('--rate', type=float, default=1.0, help="messages per second per device")
+    parser.add_argument('--duration', type=float, default=10.0, help="seconds to send for")
+    parser.add_argument('--message-size', type=int, default=256, help="bytes per message")
+    args = parser.parse_args(argv)
+
+    if not args.group:
+        parser.error("a DAA group is required (--group or $XAPTUM_GROUP)")
+
+    standin = None
+    if args.standin:
+        from xaptum.client.standin import StandInServer, discard
+        standin = StandInServer(args.group, handler=discard, backlog=max(128, args.devices))
+        standin.start()
+        (args.host, args.port) = standin.address
+
+    processes = max(1, min(args.processes, args.devices))
+    shares = [args.devices // processes + (1 if i < args.devices % processes else 0)
+              for i in range(processes)]
+    options = [(args.host, args.port, args.group, share, args.rate, args.duration,
+                args.message_size, args.concurrency) for share in shares]
+
+    pool = multiprocessing.Pool(processes)
+    try:
+        results = pool.map(_run_devices, options)
+    finally:
+        pool.close()
+        pool.join()
+        if standin is not None:
+            standin.stop()
+
+    report(_merge(results))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
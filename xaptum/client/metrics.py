@@ -0,0 +1,255 @@
+# Copyright 2017 Xaptum, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License
+
+
+from __future__ import absolute_import, division, print_function
+
+import bisect
+import ssl
+import threading
+import weakref
+
+from xaptum.xdaa.errors import XDAAError
+from xaptum.xdaa.trace import Tracer, default_buckets
+
+class _owner(object):
+    """Holds a thread's cell in its thread-local storage. It is freed when the
+    thread exits, which retires the cell.
+
+    """
+    __slots__ = ('cell', '__weakref__')
+
+    def __init__(self, cell):
+        self.cell = cell
+
+class _sharded(object):
+    """Base for metrics whose updates go to a per-thread cell, so the hot path
+    takes no lock. Readers sum the cells.
+
+    When a thread exits, its cell is folded into a base cell, so the number of
+    cells tracks the live threads rather than every thread that ever
+    recorded a value.
+
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._base = self._new_cell()
+        self._cells = {}
+        self._lock = threading.Lock()
+
+    def _cell(self):
+        try:
+            return self._local.owner.cell
+        except AttributeError:
+            cell = self._new_cell()
+            owner = self._local.owner = _owner(cell)
+            with self._lock:
+                self._cells[weakref.ref(owner, self._retire)] = cell
+            return cell
+
+    def _retire(self, ref):
+        with self._lock:
+            cell = self._cells.pop(ref)
+            for (i, value) in enumerate(cell):
+                self._base[i] += value
+
+    def _snapshot(self):
+        with self._lock:
+            return [list(self._base)] + list(self._cells.values())
+
+class Counter(_sharded):
+
+    def _new_cell(self):
+        return [0]
+
+    def inc(self, amount=1):
+        self._cell()[0] += amount
+
+    @property
+    def value(self):
+        return sum(cell[0] for cell in self._snapshot())
+
+class Histogram(_sharded):
+
+    def __init__(self, buckets=default_buckets):
+        self.bounds = tuple(buckets)
+        super(Histogram, self).__init__()
+
+    def _new_cell(self):
+        # bucket counts, then the sum of observations
+        return [0] * (len(self.bounds) + 1) + [0.0]
+
+    def observe(self, value):
+        cell = self._cell()
+        cell[bisect.bisect_left(self.bounds, value)] += 1
+        cell[-1] += value
+
+    def snapshot(self):
+        """Returns (bucket_counts, count, sum); the last bucket is +Inf."""
+        counts = [0] * (len(self.bounds) + 1)
+        total = 0.0
+        for cell in self._snapshot():
+            for i in range(len(counts)):
+                counts[i] += cell[i]
+            total += cell[-1]
+        return (counts, sum(counts), total)
+
+byte_buckets = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304,
+                16777216, 67108864, 268435456, 1073741824)
+
+class MetricsRegistry(Tracer):
+    """Counters and histograms for connections, handshakes and XDAA failures.
+
+    Pass an instance as *metrics* to *xaptum.client.connect* (or to anything
+    that forwards keyword arguments to it). It can also be passed as *tracer*
+    to record the duration of each handshake phase. Updates are lock-free
+    per-thread increments, so it can stay enabled in production. *exposition*
+    renders everything in the Prometheus text format.
+
+    """
+
+    def __init__(self, prefix='xaptum'):
+        self.prefix = prefix
+        self._metrics = {}
+        self._lock = threading.Lock()
+        self.handshakes_started   = self.counter('handshakes_started_total', 'Handshakes started')
+        self.handshakes_completed = self.counter('handshakes_completed_total', 'Handshakes completed')
+        self.ssl_errors           = self.counter('ssl_errors_total', 'ssl.SSLError raised while connecting')
+        self.bytes_sent           = self.counter('bytes_sent_total', 'Bytes sent on instrumented connections')
+        self.bytes_received       = self.counter('bytes_received_total', 'Bytes received on instrumented connections')
+        self.handshake_duration   = self.histogram('handshake_duration_seconds', 'Duration of connect, from TCP connect to TLS established')
+        self.connection_sent      = self.histogram('connection_bytes_sent', 'Bytes sent per closed connection', buckets=byte_buckets)
+        self.connection_received  = self.histogram('connection_bytes_received', 'Bytes received per closed connection', buckets=byte_buckets)
+
+    def _metric(self, kind, name, help, labels, factory):
+        key = (name, tuple(sorted(labels.items())))
+        metric = self._metrics.get(key)
+        if metric is None:
+            with self._lock:
+                metric = self._metrics.get(key)
+                if metric is None:
+                    metric = self._metrics[key] = (kind, help, factory())
+        return metric[2]
+
+    def counter(self, name, help='', **labels):
+        return self._metric('counter', name, help, labels, Counter)
+
+    def histogram(self, name, help='', buckets=default_buckets, **labels):
+        return self._metric('histogram', name, help, labels, lambda: Histogram(buckets))
+
+    def handshake_failed(self, error):
+        if isinstance(error, XDAAError):
+            kind = type(error).__name__
+        elif isinstance(error, ssl.SSLError):
+            kind = 'SSLError'
+            self.ssl_errors.inc()
+        else:
+            kind = type(error).__name__
+        self.counter('handshake_failures_total', 'Failed handshakes by error type', error=kind).inc()
+
+    def phase(self, name, duration, sent=0, received=0):
+        self.histogram('handshake_phase_seconds', 'Duration of each handshake phase', phase=name).observe(duration)
+
+    def instrument(self, sock):
+        """Wraps *sock* so its traffic is counted."""
+        return metered_socket(sock, self)
+
+    def exposition(self):
+        """Returns all metrics in the Prometheus text exposition format."""
+        with self._lock:
+            metrics = sorted(self._metrics.items())
+        lines = []
+        described = set()
+        for ((name, labels), (kind, help, metric)) in metrics:
+            name = '%s_%s'%(self.prefix, name)
+            if name not in described:
+                described.add(name)
+                lines.append('# HELP %s %s'%(name, help))
+                lines.append('# TYPE %s %s'%(name, kind))
+            if kind == 'counter':
+                lines.append('%s%s %s'%(name, _labels(labels), _number(metric.value)))
+                continue
+            (counts, count, total) = metric.snapshot()
+            cumulative = 0
+            for (bound, bucket) in zip(metric.bounds + (float('inf'),), counts):
+                cumulative += bucket
+                bucket_labels = labels + (('le', '+Inf' if bound == float('inf') else _number(bound)),)
+                lines.append('%s_bucket%s %d'%(name, _labels(bucket_labels), cumulative))
+            lines.append('%s_sum%s %s'%(name, _labels(labels), _number(total)))
+            lines.append('%s_count%s %d'%(name, _labels(labels), count))
+        return '\n'.join(lines) + '\n'
+
+def _number(value):
+    return repr(value) if isinstance(value, float) else str(value)
+
+def _labels(labels):
+    if not labels:
+        return ''
+    escaped = ('%s="%s"'%(key, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+               for (key, value) in labels)
+    return '{%s}'%','.join(escaped)
+
+class metered_socket(object):
+    """A socket proxy that counts the bytes it sends and receives."""
+
+    def __init__(self, sock, registry):
+        self._sock = sock
+        self._registry = registry
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self._closed = False
+
+    def __getattr__(self, name):
+        return getattr(self._sock, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _sent(self, size):
+        self.bytes_sent += size
+        self._registry.bytes_sent.inc(size)
+
+    def _received(self, size):
+        self.bytes_received += size
+        self._registry.bytes_received.inc(size)
+
+    def send(self, data, *args):
+        size = self._sock.send(data, *args)
+        self._sent(size)
+        return size
+
+    def sendall(self, data, *args):
+        self._sock.sendall(data, *args)
+        self._sent(len(data))
+
+    def recv(self, *args):
+        data = self._sock.recv(*args)
+        self._received(len(data))
+        return data
+
+    def recv_into(self, *args):
+        size = self._sock.recv_into(*args)
+        self._received(size)
+        return size
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self._registry.connection_sent.observe(self.bytes_sent)
+            self._registry.connection_received.observe(self.bytes_received)
+        self._sock.close()
@@ -0,0 +1,205 @@
+# Copyright 2017 Xaptum, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License
+
+
+from __future__ import absolute_import, print_function
+
+import errno
+import os
+import socket
+import ssl
+
+
+try:
+    import selectors
+except ImportError:
+    import selectors34 as selectors
+
+from xaptum import xdaa
+from xaptum.client import psk
+from xaptum.client.bulk import connect_result
+from xaptum.client.client import default_ciphers, default_ssl_version
+from xaptum.xdaa import util
+from xaptum.xdaa.util import monotonic
+
+_CONNECTING = 0
+_XDAA       = 1
+_TLS        = 2
+
+class _session(object):
+    __slots__ = ('endpoint', 'callback', 'sock', 'stage', 'handshake', 'out', 'started')
+
+    def __init__(self, endpoint, callback, sock, handshake):
+        self.endpoint = endpoint
+        self.callback = callback
+        self.sock = sock
+        self.stage = _CONNECTING
+        self.handshake = handshake
+        self.out = None
+        self.started = monotonic()
+
+class Multiplexer(object):
+    """Runs many connection setups concurrently on one thread.
+
+    Each connection started with *connect* goes through a non-blocking TCP
+    connect, the XDAA handshake (driven through *xdaa.client_handshake*) and a
+    non-blocking TLS-PSK handshake, all interleaved by a single *selectors*
+    loop in *run*. When a connection is ready or fails, its callback receives a
+    *connect_result*; ready sockets are switched back to blocking mode.
+
+    The DNS lookup in *connect* is blocking; pass numeric addresses to avoid it.
+
+    """
+
+    def __init__(self, daa_group, ciphers=default_ciphers, ssl_version=default_ssl_version,
+                 key_pool=None):
+        self.group = xdaa.parse_group(daa_group)
+        self.ciphers = ciphers
+        self.ssl_version = ssl_version
+        self.key_pool = key_pool
+        self._context = psk.context(ciphers, ssl_version)
+        self._selector = selectors.DefaultSelector()
+
+    def __len__(self):
+        return len(self._selector.get_map())
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def connect(self, host, port, callback):
+        """Starts connecting to *host*:*port*. *callback* is called from *run*
+        with the *connect_result*.
+
+        """
+        endpoint = (host, port)
+        try:
+            (family, type, proto, _, address) = socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)[0]
+            sock = socket.socket(family, type, proto)
+        except Exception as e:
+            callback(connect_result(endpoint, None, e, 0.0))
+            return
+        sock.setblocking(False)
+        util.set_nodelay(sock)
+        handshake = xdaa.client_handshake(self.group, key_pool=self.key_pool)
+        session = _session(endpoint, callback, sock, handshake)
+        err = sock.connect_ex(address)
+        if err not in (0, errno.EINPROGRESS, errno.EWOULDBLOCK):
+            sock.close()
+            callback(connect_result(endpoint, None, socket.error(err, os.strerror(err)), 0.0))
+            return
+        self._selector.register(sock, selectors.EVENT_WRITE, session)
+
+    def run(self, timeout=None):
+        """Drives the pending connections until all have completed, or until
+        *timeout* seconds have passed. Returns the number still pending.
+
+        """
+        deadline = None if timeout is None else monotonic() + timeout
+        while len(self):
+            remaining = None
+            if deadline is not None:
+                remaining = deadline - monotonic()
+                if remaining <= 0:
+                    break
+            for (key, events) in self._selector.select(remaining):
+                session = key.data
+                try:
+                    result = self._step(session, events)
+                except Exception as e:
+                    result = self._fail(session, e)
+                if result is not None:
+                    session.callback(result)
+        return len(self)
+
+    def close(self):
+        """Aborts all pending connections."""
+        for key in list(self._selector.get_map().values()):
+            self._selector.unregister(key.fileobj)
+            key.fileobj.close()
+        self._selector.close()
+
+    def _step(self, session, events):
+        """Advances *session* and returns its *connect_result* once it is ready."""
+        sock = session.sock
+        if session.stage == _CONNECTING:
+            err = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+            if err:
+                raise socket.error(err, os.strerror(err))
+            session.stage = _XDAA
+            session.out = memoryview(session.handshake.start())
+
+        if session.stage == _XDAA:
+            if session.out is not None and events & selectors.EVENT_WRITE:
+                self._send(session)
+            elif events & selectors.EVENT_READ:
+                data = sock.recv(session.handshake.bytes_needed)
+                if not data:
+                    raise xdaa.XDAASocketClosedError("Socket closed while reading ServerKeyExchange")
+                out = session.handshake.receive_data(data)
+                if out:
+                    session.out = memoryview(out)
+                    self._send(session)
+
+            if session.out is not None:
+                self._selector.modify(sock, selectors.EVENT_WRITE, session)
+                return None
+            if not session.handshake.done:
+                self._selector.modify(sock, selectors.EVENT_READ, session)
+                return None
+            self._start_tls(session)
+
+        return self._tls_step(session)
+
+    def _send(self, session):
+        try:
+            sent = session.sock.send(session.out)
+        except (socket.error, OSError) as e:
+            if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                return
+            raise
+        session.out = session.out[sent:] if sent < len(session.out) else None
+
+    def _start_tls(self, session):
+        self._selector.unregister(session.sock)
+        secret = session.handshake.shared_secret
+        session.handshake = None
+        session.sock = self._context.wrap_socket(session.sock, do_handshake_on_connect=False)
+        psk.set_client_psk(session.sock, lambda hint: (secret, 'x'))
+        session.stage = _TLS
+        self._selector.register(session.sock, selectors.EVENT_WRITE, session)
+
+    def _tls_step(self, session):
+        sock = session.sock
+        try:
+            sock.do_handshake()
+        except ssl.SSLWantReadError:
+            self._selector.modify(sock, selectors.EVENT_READ, session)
+            return None
+        except ssl.SSLWantWriteError:
+            self._selector.modify(sock, selectors.EVENT_WRITE, session)
+            return None
+        self._selector.unregister(sock)
+        sock.setblocking(True)
+        return connect_result(session.endpoint, sock, None, monotonic() - session.started)
+
+    def _fail(self, session, error):
+        try:
+            self._selector.unregister(session.sock)
+        except (KeyError, ValueError):
+            pass
+        session.sock.close()
+        return connect_result(session.endpoint, None, error, monotonic() - session.started)
@@ -0,0 +1,161 @@
+# Copyright 2017 Xaptum, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License
+
+
+from __future__ import absolute_import, print_function
+
+import contextlib
+import select
+import threading
+
+from collections import deque
+from xaptum import xdaa
+from xaptum.client.client import connect
+from xaptum.xdaa.util import monotonic
+
+class _pooled(object):
+    __slots__ = ('sock', 'key', 'created', 'last_used')
+
+    def __init__(self, sock, key, now):
+        self.sock = sock
+        self.key = key
+        self.created = now
+        self.last_used = now
+
+def _is_alive(sock):
+    """Returns whether an idle connection can still be used.
+
+    An idle connection should have nothing to read. If it is readable, the peer
+    either closed it or sent data nobody asked for, and either way it cannot be
+    handed out.
+
+    """
+    if sock.fileno() < 0:
+        return False
+    if hasattr(sock, 'pending') and sock.pending():
+        return False
+    try:
+        (readable, _, _) = select.select([sock], [], [], 0)
+    except (select.error, ValueError):
+        return False
+    return not readable
+
+class ConnectionPool(object):
+    """Keeps authenticated connections to the Xaptum ENF open for reuse.
+
+    Connections are keyed by (host, port, DAA group id). At most *max_size*
+    idle connections are kept per key. Idle connections are closed after
+    *idle_timeout* seconds and any connection is retired after *max_lifetime*
+    seconds; either limit may be None to disable it. Remaining keyword arguments
+    are passed to *xaptum.client.connect*.
+
+    Usage:
+
+        with pool.connection(host, port, group) as conn:
+            conn.sendall(request)
+            response = conn.recv(4096)
+
+    The connection returns to the pool when the block exits normally and is
+    closed if it raises.
+
+    """
+
+    def __init__(self, max_size=8, idle_timeout=60.0, max_lifetime=None, **connect_kwargs):
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.max_lifetime = max_lifetime
+        self.created = 0
+        self.reused = 0
+        self._connect_kwargs = connect_kwargs
+        self._idle = {}
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def idle_count(self):
+        with self._lock:
+            return sum(len(conns) for conns in self._idle.values())
+
+    @contextlib.contextmanager
+    def connection(self, host, port, daa_group):
+        """Context manager that yields a connected TLS socket."""
+        conn = self._acquire(host, port, daa_group)
+        try:
+            yield conn.sock
+        except BaseException:
+            conn.sock.close()
+            raise
+        self._release(conn)
+
+    def close(self):
+        """Closes all idle connections. Connections in use are closed when
+        they are returned.
+
+        """
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, {}
+        for conns in idle.values():
+            for conn in conns:
+                conn.sock.close()
+
+    def _expired(self, conn, now):
+        if self.max_lifetime is not None and now - conn.created >= self.max_lifetime:
+            return True
+        if self.idle_timeout is not None and now - conn.last_used >= self.idle_timeout:
+            return True
+        return False
+
+    def _acquire(self, host, port, daa_group):
+        group = xdaa.parse_group(daa_group)
+        key = (host, port, group.id)
+
+        while True:
+            with self._lock:
+                if self._closed:
+                    raise ValueError("ConnectionPool is closed")
+                conns = self._idle.get(key)
+                conn = conns.pop() if conns else None
+            if conn is None:
+                break
+            if not self._expired(conn, monotonic()) and _is_alive(conn.sock):
+                with self._lock:
+                    self.reused += 1
+                return conn
+            conn.sock.close()
+
+        sock = connect(host, port, group, **self._connect_kwargs)
+        with self._lock:
+            self.created += 1
+        return _pooled(sock, key, monotonic())
+
+    def _release(self, conn):
+        now = monotonic()
+        conn.last_used = now
+        stale = []
+        with self._lock:
+            if self._closed or self._expired(conn, now):
+                stale.append(conn)
+            else:
+                conns = self._idle.setdefault(conn.key, deque())
+                conns.append(conn)
+                while conns and (len(conns) > self.max_size or self._expired(conns[0], now)):
+                    stale.append(conns.popleft())
+        for conn in stale:
+            conn.sock.close()
@@ -0,0 +1,66 @@
+# Copyright 2017 Xaptum, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License
+
+
+"""TLS-PSK on *ssl* sockets and SSL objects, using the sslpsk C extension.
+
+*sslpsk.wrap_socket* builds a new context for every connection, which rules
+out session resumption and MemoryBIO use, and its lookup of the underlying
+*_ssl* object only works before Python 3.7. The lookup is done here instead,
+for every supported Python, and the callbacks are registered in sslpsk's
+callback table. That table is private to sslpsk, so setup.py pins the
+version this was written against.
+
+"""
+
+from __future__ import absolute_import, print_function
+
+import ssl
+
+from sslpsk import _sslpsk
+from sslpsk import sslpsk
+
+def _ssl_object(sock):
+    # SSLObject, and SSLSocket on Python 3.5 and 3.6, wrap the _ssl object
+    # once more. On Python 2.7 and 3.7+ SSLSocket holds it directly.
+    obj = sock._sslobj
+    return getattr(obj, '_sslobj', obj)
+
+def context(ciphers, ssl_version):
+    """Returns a new *ssl.SSLContext* for either side of a TLS-PSK connection."""
+    context = ssl.SSLContext(ssl_version)
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+    context.set_ciphers(ciphers)
+    return context
+
+def set_client_psk(sock, callback):
+    """Makes the ssl socket or SSL object *sock* authenticate with the
+    *(psk, identity)* pair returned by *callback(hint)*. Must be called before
+    the handshake starts.
+
+    """
+    ssl_id = _sslpsk.sslpsk_set_psk_client_callback(_ssl_object(sock))
+    sslpsk._register_callback(sock, ssl_id, callback)
+
+def set_server_psk(sock, callback, hint=''):
+    """Makes the ssl socket or SSL object *sock* accept clients with the psk
+    returned by *callback(identity)*. Must be called before the handshake starts.
+
+    """
+    obj = _ssl_object(sock)
+    ssl_id = _sslpsk.sslpsk_set_accept_state(obj)
+    _sslpsk.sslpsk_set_psk_server_callback(obj)
+    _sslpsk.sslpsk_use_psk_identity_hint(obj, hint)
+    sslpsk._register_callback(sock, ssl_id, callback)
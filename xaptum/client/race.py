@@ -0,0 +1,185 @@
+# Copyright 2017 Xaptum, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License
+
+
+from __future__ import absolute_import, print_function
+
+import socket
+import threading
+
+from xaptum import xdaa
+from xaptum.client.client import default_ciphers, default_ssl_version, secure_socket
+from xaptum.xdaa import util
+from xaptum.xdaa.util import monotonic
+
+class EndpointStats(object):
+    """Smoothed TCP connect round-trip times per endpoint, used to try the
+    fastest endpoints first.
+
+    """
+
+    def __init__(self, alpha=0.3, failure_penalty=5.0):
+        self.alpha = alpha
+        self.failure_penalty = failure_penalty
+        self._rtt = {}
+        self._lock = threading.Lock()
+
+    def rtt(self, endpoint):
+        return self._rtt.get(endpoint)
+
+    def update(self, endpoint, rtt):
+        with self._lock:
+            previous = self._rtt.get(endpoint)
+            if previous is None:
+                self._rtt[endpoint] = rtt
+            else:
+                self._rtt[endpoint] = (1 - self.alpha) * previous + self.alpha * rtt
+
+    def failed(self, endpoint):
+        self.update(endpoint, self.failure_penalty)
+
+    def order(self, endpoints):
+        """Returns *endpoints* sorted fastest first. Endpoints without a
+        measurement keep their relative order, after the measured ones.
+
+        """
+        unknown = float('inf')
+        return sorted(endpoints, key=lambda endpoint: self._rtt.get(endpoint, unknown))
+
+# Shared by calls to *connect_racing* that do not pass their own
+default_stats = EndpointStats()
+
+def resolve(endpoints):
+    """Expands each (host, port) into one (address, port) per resolved address,
+    keeping the resolver's order and dropping duplicates.
+
+    """
+    resolved = []
+    for (host, port) in endpoints:
+        for (_, _, _, _, address) in socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM):
+            endpoint = (address[0], address[1])
+            if endpoint not in resolved:
+                resolved.append(endpoint)
+    return resolved
+
+class _race(object):
+
+    def __init__(self, group, key_pool, timeout, stats):
+        self.group = group
+        self.key_pool = key_pool
+        self.timeout = timeout
+        self.stats = stats
+        self.winner = None
+        self.errors = []
+        self.running = 0
+        self.socks = set()
+        self.cond = threading.Condition()
+
+    def attempt(self, endpoint):
+        sock = None
+        try:
+            start = monotonic()
+            sock = socket.create_connection(endpoint, self.timeout)
+            util.set_nodelay(sock)
+            self.stats.update(endpoint, monotonic() - start)
+            with self.cond:
+                lost = self.winner is not None
+                if not lost:
+                    self.socks.add(sock)
+            if not lost:
+                secret = xdaa.negotiate_secret(sock, self.group, key_pool=self.key_pool)
+                with self.cond:
+                    if self.winner is None:
+                        self.winner = (endpoint, sock, secret)
+                        self.socks.discard(sock)
+                        sock = None
+        except Exception as e:
+            if sock is None:
+                self.stats.failed(endpoint)
+            with self.cond:
+                self.errors.append(e)
+        finally:
+            if sock is not None:
+                with self.cond:
+                    self.socks.discard(sock)
+                sock.close()
+            with self.cond:
+                self.running -= 1
+                self.cond.notify_all()
+
+def connect_racing(endpoints, daa_group, stagger=0.25, stats=None, timeout=None,
+                   ciphers=default_ciphers, ssl_version=default_ssl_version,
+                   key_pool=None, session_cache=None):
+    """Establishes a connection to the Xaptum ENF through whichever of several
+    endpoints answers first.
+
+    Each (host, port) in *endpoints* is resolved to all its addresses. The TCP
+    connect and XDAA handshake are started against each address in turn,
+    *stagger* seconds apart or as soon as the previous attempt fails, and the
+    first to finish wins; the others are abandoned and closed. Only the winner
+    goes on to the TLS handshake.
+
+    Measured connect times are kept in *stats*, *default_stats* unless another
+    *EndpointStats* is given, so later calls try the endpoints with the lowest
+    connect time first. *timeout* bounds each TCP connect and socket read
+    during the race. The other arguments are as for *connect*.
+
+    Raises the last attempt's error if every endpoint fails.
+
+    """
+    group = xdaa.parse_group(daa_group)
+    stats = stats if stats is not None else default_stats
+    candidates = stats.order(resolve(endpoints))
+    if not candidates:
+        raise socket.error("No addresses to connect to")
+
+    race = _race(group, key_pool, timeout, stats)
+    with race.cond:
+        for endpoint in candidates:
+            race.running += 1
+            thread = threading.Thread(target=race.attempt, args=(endpoint,))
+            thread.daemon = True
+            thread.start()
+
+            deadline = monotonic() + stagger
+            failures = len(race.errors)
+            while race.winner is None and len(race.errors) == failures:
+                remaining = deadline - monotonic()
+                if remaining <= 0:
+                    break
+                race.cond.wait(remaining)
+            if race.winner is not None:
+                break
+
+        while race.winner is None and race.running:
+            race.cond.wait()
+
+        # Interrupt the attempts that are still handshaking
+        for loser in race.socks:
+            try:
+                loser.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                pass
+
+    if race.winner is None:
+        raise race.errors[-1]
+
+    (endpoint, sock, secret) = race.winner
+    try:
+        sock.settimeout(None)
+        return secure_socket(sock, secret, ciphers=ciphers, ssl_version=ssl_version,
+                             session_cache=session_cache, endpoint=endpoint)
+    except Exception:
+        sock.close()
+        raise
@@ -0,0 +1,272 @@
+# Copyright 2017 Xaptum, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License
+
+
+from __future__ import absolute_import, division, print_function
+
+import mmap
+import random
+import socket
+import struct
+import threading
+
+from collections import deque
+from xaptum import xdaa
+from xaptum.client.client import connect
+from xaptum.xdaa.util import as_bytes, monotonic
+
+default_drain_timeout = 10.0
+
+class _spill_file(object):
+    """A FIFO of length-prefixed records in a memory-mapped file of fixed size.
+
+    Records are appended at the tail until the file is full and consumed from
+    the head; both reset to the start whenever the FIFO empties.
+
+    """
+
+    _length = struct.Struct('!I')
+
+    def __init__(self, path, size):
+        self._file = open(path, 'w+b')
+        self._file.truncate(size)
+        self._map = mmap.mmap(self._file.fileno(), size)
+        self._head = 0
+        self._tail = 0
+        self.count = 0
+        self.bytes = 0
+
+    def push(self, data):
+        end = self._tail + self._length.size + len(data)
+        if end > len(self._map):
+            return False
+        self._length.pack_into(self._map, self._tail, len(data))
+        self._map[self._tail + self._length.size:end] = data
+        self._tail = end
+        self.count += 1
+        self.bytes += len(data)
+        return True
+
+    def pop(self):
+        (size,) = self._length.unpack_from(self._map, self._head)
+        start = self._head + self._length.size
+        data = self._map[start:start + size]
+        self._head = start + size
+        self.count -= 1
+        self.bytes -= size
+        if self._head == self._tail:
+            self._head = self._tail = 0
+        return data
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+class ResilientConnection(object):
+    """A connection to the Xaptum ENF that reconnects on failure and buffers
+    outgoing payloads while the link is down.
+
+    *send* queues a payload and returns immediately. A background thread
+    connects with *xaptum.client.connect*, retrying with jittered exponential
+    backoff between *initial_backoff* and *max_backoff* seconds, and drains the
+    queue in batches of up to *batch_size* bytes, each written with a single
+    *sendall*. Remaining keyword arguments are passed to *connect*.
+
+    The queue holds up to *max_queue_bytes* in memory. If *spill_path* is given,
+    payloads beyond that go to a memory-mapped file of *spill_size* bytes. When
+    both are full, *send* drops the payload and returns False.
+
+    Payloads are delivered at least once: a batch interrupted by a connection
+    failure is sent again in full after reconnecting. *reconnects* counts the
+    connections made after the first.
+
+    """
+
+    def __init__(self, host, port, daa_group, max_queue_bytes=1 << 20, spill_path=None,
+                 spill_size=64 << 20, batch_size=65536, initial_backoff=0.5, max_backoff=60.0,
+                 **connect_kwargs):
+        self.host = host
+        self.port = port
+        self.group = xdaa.parse_group(daa_group)
+        self.max_queue_bytes = max_queue_bytes
+        self.batch_size = batch_size
+        self.initial_backoff = initial_backoff
+        self.max_backoff = max_backoff
+        self.sent = 0
+        self.dropped = 0
+        self.reconnects = 0
+        self.drain_rate = 0.0
+        self._connect_kwargs = connect_kwargs
+        self._memory = deque()
+        self._memory_bytes = 0
+        self._spill = _spill_file(spill_path, spill_size) if spill_path else None
+        self._inflight = []
+        self._sock = None
+        self._closed = False
+        self._aborted = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name='xaptum-resilient')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @property
+    def connected(self):
+        return self._sock is not None
+
+    @property
+    def queue_depth(self):
+        """Number of payloads waiting to be sent."""
+        spilled = self._spill.count if self._spill else 0
+        return len(self._memory) + spilled + len(self._inflight)
+
+    @property
+    def queued_bytes(self):
+        spilled = self._spill.bytes if self._spill else 0
+        return self._memory_bytes + spilled + sum(len(data) for data in self._inflight)
+
+    def send(self, payload):
+        """Queues *payload* for sending. Returns False if the queue is full and
+        the payload was dropped.
+
+        """
+        data = as_bytes(payload)
+        with self._cond:
+            if self._closed:
+                raise ValueError("ResilientConnection is closed")
+            spilling = self._spill is not None and self._spill.count
+            if not spilling and self._memory_bytes + len(data) <= self.max_queue_bytes:
+                self._memory.append(data)
+                self._memory_bytes += len(data)
+            elif self._spill is None or not self._spill.push(data):
+                self.dropped += 1
+                return False
+            self._cond.notify()
+            return True
+
+    def close(self, timeout=default_drain_timeout):
+        """Stops the connection after trying to drain the queue for up to
+        *timeout* seconds, or until it is empty if *timeout* is None.
+
+        Payloads still queued after that are dropped and a send in progress is
+        interrupted. A connect attempt in progress is left to finish on the
+        background thread, which then closes it.
+
+        """
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+        if not self._thread.is_alive():
+            return
+        with self._cond:
+            self._aborted = True
+            self._cond.notify_all()
+            sock = self._sock
+        if sock is not None:
+            # Not sock.shutdown: on an SSLSocket that drops the TLS layer, and
+            # the interrupted sendall would carry on in plaintext.
+            try:
+                socket.socket.shutdown(sock, socket.SHUT_RDWR)
+            except (socket.error, OSError):
+                pass
+        self._thread.join(timeout)
+
+    def _stopping(self):
+        return self._aborted or (self._closed and not self.queue_depth)
+
+    def _next_batch(self):
+        batch = []
+        size = 0
+        while size < self.batch_size:
+            if self._memory:
+                data = self._memory.popleft()
+                self._memory_bytes -= len(data)
+            elif self._spill is not None and self._spill.count:
+                data = self._spill.pop()
+            else:
+                break
+            batch.append(data)
+            size += len(data)
+        return batch
+
+    def _connect(self):
+        attempt = 0
+        while True:
+            with self._cond:
+                if self._stopping():
+                    return None
+            try:
+                return connect(self.host, self.port, self.group, **self._connect_kwargs)
+            except Exception:
+                pass
+            delay = min(self.max_backoff, self.initial_backoff * (2 ** attempt))
+            delay = random.uniform(delay / 2, delay)
+            attempt += 1
+            with self._cond:
+                if not self._stopping():
+                    self._cond.wait(delay)
+
+    def _run(self):
+        try:
+            self._drain()
+        finally:
+            if self._spill is not None:
+                self._spill.close()
+
+    def _drain(self):
+        first = True
+        while True:
+            if self._sock is None:
+                sock = self._connect()
+                if sock is None:
+                    return
+                with self._cond:
+                    self._sock = sock
+                    if not first:
+                        self.reconnects += 1
+                first = False
+
+            with self._cond:
+                while not self._inflight:
+                    if self._stopping():
+                        self._sock.close()
+                        self._sock = None
+                        return
+                    self._inflight = self._next_batch()
+                    if not self._inflight:
+                        self._cond.wait()
+                batch = self._inflight
+
+            start = monotonic()
+            try:
+                self._sock.sendall(b''.join(batch))
+            except Exception:
+                with self._cond:
+                    self._sock.close()
+                    self._sock = None
+                continue
+            elapsed = monotonic() - start
+
+            with self._cond:
+                self._inflight = []
+                self.sent += len(batch)
+                if elapsed > 0:
+                    rate = len(batch) / elapsed
+                    self.drain_rate = rate if not self.drain_rate else 0.8 * self.drain_rate + 0.2 * rate
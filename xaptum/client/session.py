@@ -0,0 +1,99 @@
+# Copyright 2017 Xaptum, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License
+
+
+from __future__ import absolute_import, division, print_function
+
+import threading
+
+from collections import OrderedDict
+from xaptum.client import psk
+from xaptum.xdaa.util import monotonic
+
+class SessionCache(object):
+    """Client-side cache of TLS sessions for abbreviated reconnects.
+
+    Pass an instance as *session_cache* to *xaptum.client.connect*. After each
+    TLS handshake the session is stored per (host, port) endpoint, and the next
+    connection to that endpoint offers it for resumption. If the server does not
+    accept it, OpenSSL falls back to the full handshake. At most *max_size*
+    endpoints are kept, each for at most *ttl* seconds.
+
+    Sessions are only valid with the *ssl.SSLContext* that created them, so the
+    cache also owns the contexts used for its connections.
+
+    """
+
+    def __init__(self, max_size=256, ttl=300.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.lookups = 0
+        self.offered = 0
+        self.resumed = 0
+        self._entries = OrderedDict()
+        self._contexts = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def hit_rate(self):
+        """Fraction of handshakes that resumed a cached session."""
+        return self.resumed / self.lookups if self.lookups else 0.0
+
+    def context(self, ciphers, ssl_version):
+        key = (ciphers, ssl_version)
+        with self._lock:
+            context = self._contexts.get(key)
+            if context is None:
+                context = psk.context(ciphers, ssl_version)
+                self._contexts[key] = context
+            return context
+
+    def get(self, endpoint):
+        """Returns the cached session for *endpoint*, or None."""
+        now = monotonic()
+        with self._lock:
+            self.lookups += 1
+            entry = self._entries.pop(endpoint, None)
+            if entry is None:
+                return None
+            (session, expires) = entry
+            if now >= expires:
+                return None
+            self._entries[endpoint] = entry
+            self.offered += 1
+            return session
+
+    def update(self, endpoint, sock):
+        """Records the outcome of a handshake on *sock* to *endpoint*."""
+        session = sock.session
+        with self._lock:
+            if sock.session_reused:
+                self.resumed += 1
+            self._entries.pop(endpoint, None)
+            if session is None:
+                return
+            self._entries[endpoint] = (session, monotonic() + self.ttl)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def discard(self, endpoint):
+        with self._lock:
+            self._entries.pop(endpoint, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,128 @@
+# Copyright 2017 Xaptum, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License
+
+
+from __future__ import absolute_import, print_function
+
+import socket
+import threading
+
+from xaptum import xdaa
+from xaptum.client import psk
+from xaptum.client.client import default_ciphers, default_ssl_version
+
+def echo(conn):
+    """Default stand-in handler. Echoes everything back until the peer closes."""
+    while True:
+        data = conn.recv(16384)
+        if not data:
+            return
+        conn.sendall(data)
+
+def discard(conn):
+    """Stand-in handler that reads and drops everything until the peer closes."""
+    while conn.recv(16384):
+        pass
+
+class StandInServer(object):
+    """An in-process stand-in for the ENF, for tests and benchmarks.
+
+    Listens on *host*:*port* (port 0 picks a free port, see *address*), performs
+    the server side of the XDAA handshake and, if *tls* is set, the TLS-PSK
+    handshake, and then passes the connection to *handler* on its own thread.
+    *daa_group* must include the group private key. With *fast_open*, the
+    listening socket accepts TCP Fast Open data in the SYN where supported.
+
+    """
+
+    def __init__(self, daa_group, host='127.0.0.1', port=0, handler=echo, tls=True,
+                 ciphers=default_ciphers, ssl_version=default_ssl_version, backlog=128,
+                 fast_open=False):
+        self.group = xdaa.parse_group(daa_group)
+        self.handler = handler
+        self.tls = tls
+        self.ciphers = ciphers
+        self.ssl_version = ssl_version
+        self._context = psk.context(ciphers, ssl_version)
+        self.accepted = 0
+        self.completed = 0
+        self.failed = 0
+        self._lock = threading.Lock()
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._sock.bind((host, port))
+        if fast_open and hasattr(socket, 'TCP_FASTOPEN'):
+            self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_FASTOPEN, backlog)
+        self._sock.listen(backlog)
+        self._thread = None
+
+    @property
+    def address(self):
+        return self._sock.getsockname()[:2]
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._serve, name='xaptum-standin')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        try:
+            self._sock.shutdown(socket.SHUT_RDWR)
+        except socket.error:
+            pass
+        self._sock.close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _serve(self):
+        while True:
+            try:
+                (sock, _) = self._sock.accept()
+            except (socket.error, OSError):
+                return
+            with self._lock:
+                self.accepted += 1
+            thread = threading.Thread(target=self._handle, args=(sock,))
+            thread.daemon = True
+            thread.start()
+
+    def _handle(self, sock):
+        conn = sock
+        try:
+            try:
+                secret = xdaa.accept_secret(sock, self.group)
+                if self.tls:
+                    conn = self._context.wrap_socket(sock, server_side=True,
+                                                     do_handshake_on_connect=False)
+                    psk.set_server_psk(conn, lambda identity: secret)
+                    conn.do_handshake()
+            except Exception:
+                with self._lock:
+                    self.failed += 1
+                return
+            with self._lock:
+                self.completed += 1
+            self.handler(conn)
+        except Exception:
+            pass
+        finally:
+            conn.close()
@@ -13,3 +13,15 @@
 #    limitations under the License
 
 from __future__ import absolute_import, print_function
+
+from xaptum.dds.dds import DDSError
+from xaptum.dds.dds import DDSCompressionError
+from xaptum.dds.dds import DDSFrameTooLargeError
+from xaptum.dds.dds import DDSUnsupportedVersionError
+
+from xaptum.dds.compression import DeflateCompressor
+from xaptum.dds.dispatch import DDSDispatcher
+from xaptum.dds.reader import DDSReader
+from xaptum.dds.upload import send_file
+from xaptum.dds.upload import send_stream
+from xaptum.dds.writer import DDSWriter
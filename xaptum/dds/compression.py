@@ -0,0 +1,156 @@
+# Copyright 2017 Xaptum, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License
+
+
+from __future__ import absolute_import, print_function
+
+import struct
+import sys
+import zlib
+
+from xaptum.dds import dds
+from xaptum.xdaa.util import as_bytes
+
+CODEC_NONE    = 0
+CODEC_DEFLATE = 1
+
+# Control frame payload announcing the codec: codec, persistent flag and the
+# adler32 id of the preset dictionary (0 for none).
+_announcement = struct.Struct('!BBI')
+
+# Z_SYNC_FLUSH ends every message with this empty stored block. The writer
+# strips it and the reader puts it back.
+_sync_marker = b'\x00\x00\xff\xff'
+
+# zlib's default. Level 9 doubles the hash table and pending buffer, which
+# every per-message copy of the primed context allocates and copies, for no
+# gain in ratio on payloads this small.
+_mem_level = 8
+
+# zlib takes preset dictionaries (zdict) from Python 3.3
+_has_zdict = sys.version_info >= (3, 3)
+
+if sys.version_info >= (3,):
+    def _readable(payload):
+        return payload
+else:
+    # Python 2 zlib only reads strings and old-style buffers, not memoryviews
+    _readable = as_bytes
+
+def _check_dictionary(dictionary):
+    if dictionary and not _has_zdict:
+        raise dds.DDSCompressionError("Preset dictionaries need Python 3.3+")
+
+def dictionary_id(dictionary):
+    return zlib.adler32(dictionary) & 0xffffffff if dictionary else 0
+
+class DeflateCompressor(object):
+    """Raw deflate compression of DDS payloads, optionally primed with a preset
+    *dictionary* shared with the reader.
+
+    By default each payload is compressed on its own, starting from a copy of
+    a context primed with the dictionary, and sent uncompressed when that does
+    not make it smaller. With *persistent*, one context spans the whole stream,
+    so repeats of earlier messages compress too; every payload must then be
+    compressed, and the reader must see every frame in order.
+
+    Preset dictionaries need Python 3.3+; earlier versions raise
+    *DDSCompressionError*.
+
+    """
+
+    def __init__(self, dictionary=b'', persistent=False, level=zlib.Z_DEFAULT_COMPRESSION):
+        _check_dictionary(dictionary)
+        self.dictionary = dictionary
+        self.persistent = persistent
+        self.bytes_in = 0
+        self.bytes_out = 0
+        if dictionary:
+            self._context = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS,
+                                             _mem_level, zlib.Z_DEFAULT_STRATEGY, dictionary)
+        else:
+            self._context = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS, _mem_level)
+
+    @property
+    def ratio(self):
+        """Compressed bytes out per byte in, over everything compressed so far."""
+        return self.bytes_out / float(self.bytes_in) if self.bytes_in else 1.0
+
+    def announcement(self):
+        return _announcement.pack(CODEC_DEFLATE, 1 if self.persistent else 0,
+                                  dictionary_id(self.dictionary))
+
+    def compress(self, payload):
+        """Returns the compressed payload, or None to send it uncompressed."""
+        if self.persistent:
+            context = self._context
+            compressed = context.compress(payload) + context.flush(zlib.Z_SYNC_FLUSH)
+            compressed = compressed[:-len(_sync_marker)]
+        else:
+            context = self._context.copy()
+            compressed = context.compress(payload) + context.flush()
+            if len(compressed) >= len(payload):
+                return None
+        self.bytes_in += len(payload)
+        self.bytes_out += len(compressed)
+        return compressed
+
+class DeflateDecompressor(object):
+    """Inflates payloads from a *DeflateCompressor* with the same *dictionary*
+    and *persistent* setting. As there, preset dictionaries need Python 3.3+.
+
+    """
+
+    def __init__(self, dictionary=b'', persistent=False, max_size=1 << 20):
+        _check_dictionary(dictionary)
+        self.persistent = persistent
+        self.max_size = max_size
+        if dictionary:
+            self._context = zlib.decompressobj(-zlib.MAX_WBITS, dictionary)
+        else:
+            self._context = zlib.decompressobj(-zlib.MAX_WBITS)
+
+    def decompress(self, payload):
+        if self.persistent:
+            context = self._context
+            payload = as_bytes(payload) + _sync_marker
+        else:
+            context = self._context.copy()
+            payload = _readable(payload)
+        result = context.decompress(payload, self.max_size)
+        if context.unconsumed_tail:
+            raise dds.DDSFrameTooLargeError("Decompressed payload exceeds %d bytes"%self.max_size)
+        if not self.persistent:
+            result += context.flush()
+        return result
+
+def decompressor_from_announcement(payload, dictionaries, max_size):
+    """Returns the decompressor announced in a control frame, or None if the
+    announcement turns compression off.
+
+    *dictionaries* maps dictionary ids to the preset dictionaries this reader
+    knows. Raises *DDSCompressionError* for unknown codecs or dictionaries.
+
+    """
+    (codec, persistent, dict_id) = _announcement.unpack_from(payload)
+    if codec == CODEC_NONE:
+        return None
+    if codec != CODEC_DEFLATE:
+        raise dds.DDSCompressionError("Unsupported compression codec %d"%codec)
+    dictionary = b''
+    if dict_id:
+        dictionary = dictionaries.get(dict_id)
+        if dictionary is None:
+            raise dds.DDSCompressionError("Unknown preset dictionary %08x"%dict_id)
+    return DeflateDecompressor(dictionary, bool(persistent), max_size)
@@ -0,0 +1,101 @@
+# Copyright 2017 Xaptum, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License
+
+
+from __future__ import absolute_import, print_function
+
+import struct
+
+from collections import namedtuple
+
+class DDSError(Exception):
+    pass
+
+class DDSFrameTooLargeError(DDSError):
+    pass
+
+class DDSUnsupportedVersionError(DDSError):
+    pass
+
+class DDSCompressionError(DDSError):
+    pass
+
+version = 0
+
+# Frame header: version, flags, topic length, payload length. The topic and
+# then the payload follow.
+_header    = struct.Struct('!BBHI')
+header_len = _header.size
+
+max_topic_len   = 0xFFFF
+max_payload_len = 0xFFFFFFFF
+
+# Frame flags
+FLAG_COMPRESSED = 0x01  # payload is compressed with the announced codec
+FLAG_CONTROL    = 0x02  # consumed by the DDS layer, never delivered
+
+class frame(namedtuple('frame', ['flags',
+                                 'topic',
+                                 'payload'])):
+    __slots__ = ()
+
+def encode_topic(topic):
+    if isinstance(topic, bytes):
+        encoded = topic
+    else:
+        encoded = topic.encode('utf-8')
+    if len(encoded) > max_topic_len:
+        raise DDSFrameTooLargeError("Topic is %d bytes, limit is %d"%(len(encoded), max_topic_len))
+    return encoded
+
+def frame_len(topic, payload):
+    """Returns the encoded size of a frame. *topic* must already be encoded."""
+    return header_len + len(topic) + len(payload)
+
+def pack_header_into(buf, offset, flags, topic, payload_len):
+    """Packs the frame header and *topic* into *buf* at *offset* and returns the
+    offset at which the payload starts. *topic* must already be encoded.
+
+    """
+    if payload_len > max_payload_len:
+        raise DDSFrameTooLargeError("Payload is %d bytes, limit is %d"%(payload_len, max_payload_len))
+    _header.pack_into(buf, offset, version, flags, len(topic), payload_len)
+    offset += header_len
+    end = offset + len(topic)
+    buf[offset:end] = topic
+    return end
+
+def frame_into(buf, offset, topic, payload, flags=0):
+    """Packs a complete frame into *buf* at *offset* and returns the offset just
+    past it. *topic* must already be encoded.
+
+    """
+    offset = pack_header_into(buf, offset, flags, topic, len(payload))
+    end = offset + len(payload)
+    buf[offset:end] = payload
+    return end
+
+def unpack_header(buf, offset=0):
+    """Returns the (flags, topic_len, payload_len) of the frame header in *buf* at
+    *offset*.
+
+    """
+    (frame_version,
+     flags,
+     topic_len,
+     payload_len) = _header.unpack_from(buf, offset)
+    if frame_version != version:
+        raise DDSUnsupportedVersionError("Frame has version %d. Only version %d is supported."%
+                                         (frame_version, version))
+    return (flags, topic_len, payload_len)
@@ -0,0 +1,234 @@
+# Copyright 2017 Xaptum, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License
+
+
+from __future__ import absolute_import, print_function
+
+import select
+import threading
+
+from collections import deque
+from xaptum.dds.reader import DDSReader
+from xaptum.xdaa.trace import HistogramTracer
+from xaptum.xdaa.util import as_bytes, monotonic
+
+class _topic_queue(object):
+    __slots__ = ('messages', 'scheduled')
+
+    def __init__(self):
+        self.messages = deque()
+        self.scheduled = False
+
+class _stopped(Exception):
+    pass
+
+class _stoppable_socket(object):
+    """Waits in short polls for *sock* to be readable before each *recv_into*,
+    so the reader notices *stopping()* without a timeout on the socket, which
+    would also apply to the caller's sends, or a shutdown, which an SSLSocket
+    does not survive.
+
+    """
+
+    def __init__(self, sock, stopping, interval):
+        self.sock = sock
+        self.stopping = stopping
+        self.interval = interval
+
+    def recv_into(self, buf, nbytes):
+        # Decrypted bytes an SSLSocket already holds do not show up in select
+        pending = getattr(self.sock, 'pending', None)
+        if pending is None or not pending():
+            while not select.select([self.sock], [], [], self.interval)[0]:
+                if self.stopping():
+                    raise _stopped()
+        return self.sock.recv_into(buf, nbytes)
+
+class DDSDispatcher(object):
+    """Reads DDS frames from a connected socket on one thread and hands each
+    payload to the handler routed for its topic on a pool of *workers* threads.
+
+    *routes* maps topics to their handlers from the first message on; *route*
+    adds more once started. Handlers are called as *handler(topic, payload)*
+    with the payload copied to bytes. Messages on one topic are handled one at
+    a time, in the order received; different topics are handled in parallel.
+    Topics without a route go to *default*, or are dropped and counted in
+    *unrouted* if it is None.
+
+    Each topic queues at most *queue_size* messages. When one is full, reading
+    pauses until a worker catches up, pushing back on the sender through TCP
+    flow control rather than buffering without bound. Handler durations are
+    kept per topic in *latency*, a *xaptum.xdaa.HistogramTracer*, and
+    exceptions from handlers are counted in *errors*.
+
+    """
+
+    poll_interval = 0.1
+
+    def __init__(self, sock, routes=None, workers=4, queue_size=1024, default=None,
+                 max_frame_size=1 << 20, buffer_size=65536, dictionaries=()):
+        self.sock = sock
+        self.workers = workers
+        self.queue_size = queue_size
+        self.default = default
+        self.latency = HistogramTracer()
+        self.received = 0
+        self.handled = 0
+        self.unrouted = 0
+        self.errors = 0
+        self._reader = DDSReader(_stoppable_socket(sock, self._is_stopping, self.poll_interval),
+                                 max_frame_size, buffer_size, dictionaries)
+        self._handlers = dict(routes or {})
+        self._queues = {}
+        self._ready = deque()
+        self._lock = threading.Lock()
+        self._not_full = threading.Condition(self._lock)
+        self._work = threading.Condition(self._lock)
+        self._reading = False
+        self._stopping = False
+        self._error = None
+        self._threads = []
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def route(self, topic, handler):
+        """Sends messages on *topic* to *handler*. Messages already queued keep
+        the handler they were routed to, so pass routes needed from the start
+        to the constructor instead.
+
+        """
+        with self._lock:
+            self._handlers[topic] = handler
+
+    def queue_depth(self, topic=None):
+        """Returns the number of messages waiting on *topic*, or on all topics."""
+        with self._lock:
+            if topic is not None:
+                queue = self._queues.get(topic)
+                return len(queue.messages) if queue is not None else 0
+            return sum(len(queue.messages) for queue in self._queues.values())
+
+    def queue_depths(self):
+        """Returns {topic: messages waiting}."""
+        with self._lock:
+            return dict((topic, len(queue.messages)) for (topic, queue) in self._queues.items())
+
+    def start(self):
+        self._reading = True
+        self._threads = [threading.Thread(target=self._read, name='xaptum-dds-reader')]
+        for i in range(self.workers):
+            self._threads.append(threading.Thread(target=self._serve,
+                                                  name='xaptum-dds-worker-%d'%i))
+        for thread in self._threads:
+            thread.daemon = True
+            thread.start()
+
+    def join(self, timeout=None):
+        """Waits until the peer closes the connection and every queued message
+        has been handled. Returns False if *timeout* seconds passed first.
+
+        Raises the error that stopped the reader, if any.
+
+        """
+        deadline = None if timeout is None else monotonic() + timeout
+        for thread in self._threads:
+            thread.join(None if deadline is None else max(0, deadline - monotonic()))
+            if thread.is_alive():
+                return False
+        if self._error is not None:
+            raise self._error
+        return True
+
+    def stop(self, timeout=None):
+        """Stops reading, handles the messages already queued and waits for the
+        threads to finish. The reader notices within *poll_interval* seconds,
+        unless it is waiting for the rest of a TLS record. The socket is left
+        open and usable for the caller to close.
+
+        """
+        with self._lock:
+            self._stopping = True
+            self._not_full.notify_all()
+        return self.join(timeout)
+
+    def _is_stopping(self):
+        return self._stopping
+
+    def _read(self):
+        try:
+            for frame in self._reader:
+                if self._stopping:
+                    return
+                payload = as_bytes(frame.payload)
+                with self._lock:
+                    self.received += 1
+                    handler = self._handlers.get(frame.topic, self.default)
+                    if handler is None:
+                        self.unrouted += 1
+                        continue
+                    queue = self._queues.get(frame.topic)
+                    if queue is None:
+                        queue = self._queues[frame.topic] = _topic_queue()
+                    while len(queue.messages) >= self.queue_size and not self._stopping:
+                        self._not_full.wait()
+                    if self._stopping:
+                        return
+                    queue.messages.append((handler, payload))
+                    if not queue.scheduled:
+                        queue.scheduled = True
+                        self._ready.append(frame.topic)
+                        self._work.notify()
+        except Exception as e:
+            if not self._stopping:
+                self._error = e
+        finally:
+            with self._lock:
+                self._reading = False
+                self._work.notify_all()
+
+    def _serve(self):
+        while True:
+            with self._lock:
+                while not self._ready:
+                    if not self._reading:
+                        return
+                    self._work.wait()
+                topic = self._ready.popleft()
+                queue = self._queues[topic]
+                (handler, payload) = queue.messages.popleft()
+                self._not_full.notify()
+
+            start = monotonic()
+            try:
+                handler(topic, payload)
+                failed = False
+            except Exception:
+                failed = True
+            self.latency.phase(topic, monotonic() - start)
+
+            # Hand the topic back only now, so no other worker can overtake
+            with self._lock:
+                self.handled += 1
+                if failed:
+                    self.errors += 1
+                if queue.messages:
+                    self._ready.append(topic)
+                    self._work.notify()
+                else:
+                    queue.scheduled = False
@@ -0,0 +1,153 @@
+# Copyright 2017 Xaptum, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License
+
+
+from __future__ import absolute_import, print_function
+
+from xaptum.dds import compression, dds
+
+class frame_decoder(object):
+    """Incremental DDS frame decoder over a fixed-size buffer.
+
+    Receive into *writable()*, report the byte count to *commit*, and then
+    iterate *frames()*. Each frame's payload is a memoryview into the decoder's
+    buffer, valid until the next call to *writable* or *feed*. Memory use is
+    fixed at max(*buffer_size*, *max_frame_size*) bytes. Frames larger than
+    *max_frame_size* raise *DDSFrameTooLargeError*.
+
+    """
+
+    def __init__(self, max_frame_size=1 << 20, buffer_size=65536):
+        self.max_frame_size = max_frame_size
+        self._buf = bytearray(max(buffer_size, max_frame_size, dds.header_len))
+        self._view = memoryview(self._buf)
+        self._start = 0
+        self._end = 0
+
+    @property
+    def pending(self):
+        """Number of buffered bytes not yet returned as frames."""
+        return self._end - self._start
+
+    def _needed(self):
+        """Returns the size of the frame at the head of the buffer, or the header
+        size if its header is incomplete.
+
+        """
+        if self.pending < dds.header_len:
+            return dds.header_len
+        (_, topic_len, payload_len) = dds.unpack_header(self._buf, self._start)
+        size = dds.header_len + topic_len + payload_len
+        if size > self.max_frame_size:
+            raise dds.DDSFrameTooLargeError("Frame is %d bytes, limit is %d"%
+                                            (size, self.max_frame_size))
+        return size
+
+    def writable(self):
+        """Returns a memoryview of the free space at the end of the buffer. It is
+        empty if the buffer is full of frames that have not been consumed.
+
+        """
+        if self._start == self._end:
+            self._start = self._end = 0
+        elif self._start + self._needed() > len(self._buf):
+            pending = self.pending
+            self._view[0:pending] = self._view[self._start:self._end]
+            self._start = 0
+            self._end = pending
+        return self._view[self._end:]
+
+    def commit(self, size):
+        """Marks *size* bytes written to the last *writable()* view as received."""
+        self._end += size
+
+    def feed(self, data):
+        """Copies *data* into the buffer. Returns the number of bytes taken, which
+        is less than len(data) if the buffer is full.
+
+        """
+        view = self.writable()
+        size = min(len(view), len(data))
+        view[:size] = memoryview(data)[:size]
+        self.commit(size)
+        return size
+
+    def frames(self):
+        """Yields the complete frames in the buffer."""
+        buf = self._buf
+        while self.pending >= dds.header_len:
+            size = self._needed()
+            if self.pending < size:
+                return
+            (flags, topic_len, payload_len) = dds.unpack_header(buf, self._start)
+            topic_start = self._start + dds.header_len
+            payload_start = topic_start + topic_len
+            self._start += size
+            yield dds.frame(flags,
+                            buf[topic_start:payload_start].decode('utf-8'),
+                            self._view[payload_start:payload_start + payload_len])
+
+class DDSReader(object):
+    """Reads DDS frames from a connected socket with *recv_into*.
+
+    Iterating yields *dds.frame* tuples. Each payload is a memoryview into the
+    reader's buffer and is only valid until the next frame is requested; copy
+    it to keep it. At most the buffer's capacity is read ahead of the consumer,
+    so memory stays constant however fast the peer sends. Iteration ends when
+    the peer closes the connection between frames.
+
+    Control frames are consumed here. If the writer announces compression,
+    compressed payloads are decompressed and yielded as bytes; preset
+    dictionaries it may use must be given in *dictionaries*.
+
+    """
+
+    def __init__(self, sock, max_frame_size=1 << 20, buffer_size=65536, dictionaries=()):
+        self.sock = sock
+        self.frames_read = 0
+        self.bytes_read = 0
+        self.max_frame_size = max_frame_size
+        self.dictionaries = dict((compression.dictionary_id(d), d) for d in dictionaries)
+        self._decoder = frame_decoder(max_frame_size, buffer_size)
+        self._decompressor = None
+
+    def _receive(self, frame):
+        if frame.flags & dds.FLAG_CONTROL:
+            self._decompressor = compression.decompressor_from_announcement(
+                frame.payload, self.dictionaries, self.max_frame_size)
+            return None
+        if frame.flags & dds.FLAG_COMPRESSED:
+            if self._decompressor is None:
+                raise dds.DDSCompressionError("Compressed frame without a codec announcement")
+            payload = self._decompressor.decompress(frame.payload)
+            return dds.frame(frame.flags & ~dds.FLAG_COMPRESSED, frame.topic, payload)
+        return frame
+
+    def __iter__(self):
+        decoder = self._decoder
+        while True:
+            for frame in decoder.frames():
+                frame = self._receive(frame)
+                if frame is None:
+                    continue
+                self.frames_read += 1
+                yield frame
+            view = decoder.writable()
+            read = self.sock.recv_into(view, len(view))
+            if read == 0:
+                if decoder.pending:
+                    raise dds.DDSError("Socket closed in the middle of a frame")
+                return
+            self.bytes_read += read
+            decoder.commit(read)
@@ -0,0 +1,128 @@
+# Copyright 2017 Xaptum, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License
+
+
+from __future__ import absolute_import, division, print_function
+
+import mmap
+import os
+import sys
+
+from xaptum.dds import dds
+from xaptum.xdaa.util import monotonic
+
+default_chunk_size = 64 * 1024
+
+if sys.version_info >= (3,):
+    def _chunk(view, offset, size):
+        return view[offset:offset + size]
+
+    def _release(view):
+        view.release()
+
+    _view = memoryview
+else:
+    # Python 2 mmaps only offer the old buffer interface, whose views need no
+    # release. Slicing a buffer copies, so take each chunk as a new buffer.
+    def _chunk(view, offset, size):
+        return buffer(view, offset, size)
+
+    def _release(view):
+        pass
+
+    _view = buffer
+
+class _progress(object):
+    __slots__ = ('callback', 'total', 'sent', 'start')
+
+    def __init__(self, callback, total):
+        self.callback = callback
+        self.total = total
+        self.sent = 0
+        self.start = monotonic()
+
+    def update(self, size):
+        self.sent += size
+        if self.callback is not None:
+            elapsed = monotonic() - self.start
+            rate = self.sent / elapsed if elapsed > 0 else 0.0
+            self.callback(self.sent, self.total, rate)
+
+def send_stream(sock, stream, topic='', chunk_size=default_chunk_size, progress=None, total=None):
+    """Sends the contents of the binary file object *stream* as a sequence of DDS
+    frames of up to *chunk_size* bytes on *topic*, and returns the number of
+    payload bytes sent.
+
+    Each chunk is read with *readinto* directly behind the space reserved for
+    its frame header in a single reusable buffer, so memory use is fixed and
+    each frame goes out with one *sendall*. If *progress* is given, it is
+    called after each frame as progress(bytes_sent, total, bytes_per_sec), with
+    *total* as passed in (None if unknown).
+
+    Flush any *DDSWriter* on the same socket first, so frames do not
+    interleave.
+
+    """
+    topic = dds.encode_topic(topic)
+    header_len = dds.header_len + len(topic)
+    buf = bytearray(header_len + chunk_size)
+    view = memoryview(buf)
+    body = view[header_len:]
+    report = _progress(progress, total)
+    while True:
+        size = stream.readinto(body)
+        if not size:
+            break
+        dds.pack_header_into(buf, 0, 0, topic, size)
+        sock.sendall(view[:header_len + size])
+        report.update(size)
+    return report.sent
+
+def send_file(sock, path, topic='', chunk_size=default_chunk_size, progress=None):
+    """Sends the file at *path* as a sequence of DDS frames of up to *chunk_size*
+    bytes on *topic*, and returns the number of payload bytes sent.
+
+    The file is memory-mapped and each chunk is sent straight from the mapping,
+    so only the pages in flight need to be resident, however large the file.
+    *progress* is as for *send_stream*, with the file size as the total.
+
+    """
+    topic = dds.encode_topic(topic)
+    header = bytearray(dds.header_len + len(topic))
+    with open(path, 'rb') as f:
+        total = os.fstat(f.fileno()).st_size
+        report = _progress(progress, total)
+        if total == 0:
+            return 0
+        mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            view = _view(mapping)
+            try:
+                for offset in range(0, total, chunk_size):
+                    chunk = _chunk(view, offset, chunk_size)
+                    try:
+                        dds.pack_header_into(header, 0, 0, topic, len(chunk))
+                        sock.sendall(header)
+                        sock.sendall(chunk)
+                        size = len(chunk)
+                    finally:
+                        # An unreleased chunk would make mapping.close() fail
+                        # and hide the error
+                        _release(chunk)
+                    report.update(size)
+            finally:
+                _release(view)
+        finally:
+            mapping.close()
+    return report.sent
@@ -0,0 +1,159 @@
+# Copyright 2017 Xaptum, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License
+
+
+from __future__ import absolute_import, print_function
+
+import threading
+
+from xaptum.dds import dds
+from xaptum.xdaa.util import monotonic
+
+class DDSWriter(object):
+    """Writes DDS frames to a connected socket, coalescing small frames.
+
+    Frames are packed into one reusable buffer of *flush_size* bytes, which is
+    sent with a single *sendall* (and so as few TLS records as possible) when
+    the next frame would not fit, or when the oldest buffered frame has waited
+    *max_delay* seconds. A *max_delay* of None disables the timed flush, leaving
+    it to *flush* and *close*. Payloads too large for the buffer are sent
+    directly from the caller's buffer after the pending frames.
+
+    If *compression* is given (see *xaptum.dds.compression*), it is announced
+    to the reader in a control frame and each payload is compressed with it.
+
+    Errors from a timed flush are raised by the next call to *write*, *flush*
+    or *close*.
+
+    """
+
+    def __init__(self, sock, flush_size=16384, max_delay=0.005, compression=None):
+        self.sock = sock
+        self.flush_size = flush_size
+        self.max_delay = max_delay
+        self.compression = compression
+        self.messages = 0
+        self.flushes = 0
+        self.bytes_sent = 0
+        self._buf = bytearray(flush_size)
+        self._view = memoryview(self._buf)
+        self._len = 0
+        self._first = None
+        self._error = None
+        self._closed = False
+        self._cond = threading.Condition()
+        self._thread = None
+        if compression is not None:
+            self.write_frame(dds.FLAG_CONTROL, b'', compression.announcement())
+        if max_delay is not None:
+            self._thread = threading.Thread(target=self._flush_on_delay, name='dds-writer')
+            self._thread.daemon = True
+            self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def write(self, payload, topic=''):
+        """Queues *payload* as one frame on *topic*."""
+        topic = dds.encode_topic(topic)
+        with self._cond:
+            self._check()
+            flags = 0
+            if self.compression is not None:
+                compressed = self.compression.compress(payload)
+                if compressed is not None:
+                    (flags, payload) = (dds.FLAG_COMPRESSED, compressed)
+            self._write(flags, topic, payload)
+
+    def write_frame(self, flags, topic, payload):
+        """Queues a frame with raw *flags*. *topic* must already be encoded."""
+        with self._cond:
+            self._check()
+            self._write(flags, topic, payload)
+
+    def _write(self, flags, topic, payload):
+        size = dds.frame_len(topic, payload)
+        if self._len + size > self.flush_size:
+            self._flush()
+        if size > self.flush_size:
+            header = bytearray(dds.header_len + len(topic))
+            dds.pack_header_into(header, 0, flags, topic, len(payload))
+            self._send(header)
+            self._send(payload)
+        else:
+            self._len = dds.frame_into(self._buf, self._len, topic, payload, flags)
+            if self._first is None:
+                self._first = monotonic()
+                self._cond.notify()
+        self.messages += 1
+
+    def flush(self):
+        """Sends all buffered frames."""
+        with self._cond:
+            self._check()
+            self._flush()
+
+    def close(self):
+        """Flushes and stops the timed flush. Does not close the socket."""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            thread, self._thread = self._thread, None
+            self._cond.notify()
+        if thread is not None:
+            thread.join()
+        with self._cond:
+            self._raise_error()
+            self._flush()
+
+    def _check(self):
+        self._raise_error()
+        if self._closed:
+            raise ValueError("DDSWriter is closed")
+
+    def _raise_error(self):
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    def _send(self, data):
+        self.sock.sendall(data)
+        self.flushes += 1
+        self.bytes_sent += len(data)
+
+    def _flush(self):
+        if self._len:
+            length, self._len = self._len, 0
+            self._first = None
+            self._send(self._view[:length])
+
+    def _flush_on_delay(self):
+        with self._cond:
+            while not self._closed:
+                if self._first is None:
+                    self._cond.wait()
+                    continue
+                remaining = self._first + self.max_delay - monotonic()
+                if remaining > 0:
+                    self._cond.wait(remaining)
+                    continue
+                try:
+                    self._flush()
+                except Exception as e:
+                    self._error = e
+                    self._first = None
@@ -14,10 +14,40 @@
 
 from __future__ import absolute_import, print_function
 
-from xaptum.xdaa.xdaa import negotiate_secret
+import importlib
+import sys
 
-from xaptum.xdaa.xdaa import XDAAError
-from xaptum.xdaa.xdaa import XDAAIncorrectGroupError
-from xaptum.xdaa.xdaa import XDAAInvalidSignatureError
-from xaptum.xdaa.xdaa import XDAASocketClosedError
-from xaptum.xdaa.xdaa import XDAAUnsupportedVersionError
+from xaptum.xdaa.errors import XDAAError
+from xaptum.xdaa.errors import XDAAIncorrectGroupError
+from xaptum.xdaa.errors import XDAAInvalidSignatureError
+from xaptum.xdaa.errors import XDAASocketClosedError
+from xaptum.xdaa.errors import XDAATimeoutError
+from xaptum.xdaa.errors import XDAAUnsupportedVersionError
+
+# Loaded on first use, since they pull in cryptography and donna25519
+_exports = {'negotiate_secret'   : 'xaptum.xdaa.xdaa',
+            'accept_secret'      : 'xaptum.xdaa.xdaa',
+            'client_handshake'   : 'xaptum.xdaa.xdaa',
+            'complete_handshake' : 'xaptum.xdaa.xdaa',
+            'daa_group'          : 'xaptum.xdaa.xdaa',
+            'parse_group'        : 'xaptum.xdaa.xdaa',
+            'EphemeralKeyPool'   : 'xaptum.xdaa.keypool',
+            'Tracer'             : 'xaptum.xdaa.trace',
+            'HistogramTracer'    : 'xaptum.xdaa.trace'}
+
+if sys.version_info >= (3, 5):
+    _exports['negotiate_secret_async'] = 'xaptum.xdaa.aio'
+
+if sys.version_info >= (3, 7):
+    def __getattr__(name):
+        if name not in _exports:
+            raise AttributeError("module %r has no attribute %r"%(__name__, name))
+        value = getattr(importlib.import_module(_exports[name]), name)
+        globals()[name] = value
+        return value
+
+    def __dir__():
+        return sorted(set(globals()) | set(_exports))
+else:
+    for (_name, _module) in _exports.items():
+        globals()[_name] = getattr(importlib.import_module(_module), _name)
@@ -0,0 +1,53 @@
+# Copyright 2017 Xaptum, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License
+
+
+from __future__ import absolute_import, print_function
+
+import asyncio
+
+from xaptum.xdaa.xdaa import XDAASocketClosedError, client_handshake
+
+async def negotiate_secret_async(reader, writer, group, key_pool=None, tracer=None):
+    """Performs the XDAA handshake on the given asyncio streams and returns the
+    negotiated shared secret.
+
+    *group* is either a *daa_group* or its encoded 'id,public,private' string.
+    If *key_pool* is given, the ephemeral key pair and nonce are taken from
+    that *EphemeralKeyPool*. If *tracer* is given, each phase of the handshake
+    is reported to that *trace.Tracer*.
+
+    Raises *OSError* on underlying socket errors and *xdaa.XDAAError* on
+    handshake errors.
+
+    """
+    handshake = client_handshake(group, key_pool=key_pool, tracer=tracer)
+
+    # ClientHello
+    writer.write(handshake.start())
+    await writer.drain()
+
+    # ServerKeyExchange, answered by the ClientKeyExchange
+    while not handshake.done:
+        try:
+            buf = await reader.readexactly(handshake.bytes_needed)
+        except asyncio.IncompleteReadError:
+            raise XDAASocketClosedError("Socket closed while reading ServerKeyExchange")
+        out = handshake.receive_data(buf)
+        if out:
+            writer.write(out)
+            await writer.drain()
+
+    # Done
+    return handshake.shared_secret
@@ -0,0 +1,41 @@
+# Copyright 2017 Xaptum, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License
+
+
+from __future__ import absolute_import, print_function
+
+class XDAAError(Exception):
+    pass
+
+class XDAAIncorrectGroupError(XDAAError):
+    pass
+
+class XDAAInvalidSignatureError(XDAAError):
+    pass
+
+class XDAASocketClosedError(XDAAError):
+    pass
+
+class XDAATimeoutError(XDAAError):
+    """Raised when a handshake deadline passes. *phase* names the phase that
+    ran out of time, using the *xaptum.xdaa.trace* phase names.
+
+    """
+
+    def __init__(self, message, phase=None):
+        super(XDAATimeoutError, self).__init__(message)
+        self.phase = phase
+
+class XDAAUnsupportedVersionError(XDAAError):
+    pass
@@ -0,0 +1,102 @@
+# Copyright 2017 Xaptum, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License
+
+
+from __future__ import absolute_import, print_function
+
+import os
+import threading
+
+from collections import deque
+from xaptum.xdaa import x25519
+
+class EphemeralKeyPool(object):
+    """A pool of single-use x25519 key pairs and client nonces, generated ahead
+    of time by a background thread.
+
+    Pass the pool to *negotiate_secret* (or *xaptum.client.connect*) to take the
+    ephemeral key generation out of the handshake. Each entry is handed out at
+    most once. When the pool is empty, the entry is generated on the spot and
+    counted as a miss.
+
+    """
+
+    def __init__(self, watermark=64, nonce_len=32):
+        self.watermark = watermark
+        self.nonce_len = nonce_len
+        self.hits = 0
+        self.misses = 0
+        self._entries = deque()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopped = False
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def start(self):
+        """Starts the background thread that fills the pool up to the watermark."""
+        with self._cond:
+            if self._thread is not None:
+                return
+            self._stopped = False
+            self._thread = threading.Thread(target=self._fill,
+                                            name='xdaa-ephemeral-key-pool')
+            self._thread.daemon = True
+            self._thread.start()
+
+    def stop(self):
+        """Stops the background thread and discards the unused entries."""
+        with self._cond:
+            thread = self._thread
+            self._thread = None
+            self._stopped = True
+            self._entries.clear()
+            self._cond.notify_all()
+        if thread is not None:
+            thread.join()
+
+    def take(self):
+        """Removes and returns a *(nonce, x25519.key_pair)* tuple."""
+        with self._cond:
+            if self._entries:
+                self.hits += 1
+                entry = self._entries.popleft()
+                self._cond.notify()
+                return entry
+            self.misses += 1
+        return self._generate()
+
+    def _generate(self):
+        return (os.urandom(self.nonce_len), x25519.key_pair())
+
+    def _fill(self):
+        while True:
+            with self._cond:
+                while not self._stopped and len(self._entries) >= self.watermark:
+                    self._cond.wait()
+                if self._stopped:
+                    return
+            entry = self._generate()
+            with self._cond:
+                if self._stopped:
+                    return
+                self._entries.append(entry)
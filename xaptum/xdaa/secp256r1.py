@@ -20,45 +20,51 @@ from cryptography.exceptions import InvalidSignature
 from cryptography.hazmat import backends
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.asymmetric import ec
+from xaptum.xdaa.util import as_bytes
+
+# Stateless, so shared by every key rather than allocated per call
+_backend      = backends.default_backend()
+_curve        = ec.SECP256R1()
+_ecdsa_sha256 = ec.ECDSA(hashes.SHA256())
 
 def public_key_from_encoded_point(point):
-    raw = ec.EllipticCurvePublicNumbers.from_encoded_point(ec.SECP256R1(), point).public_key(backends.default_backend())
+    raw = ec.EllipticCurvePublicNumbers.from_encoded_point(_curve, point).public_key(_backend)
     return public_key(raw)
 
 def public_key_from_encoded_point_hex(point):
     return public_key_from_encoded_point(codecs.decode(point, 'hex'))
 
 def private_key_from_int(value):
-    raw = ec.derive_private_key(value, ec.SECP256R1(), backends.default_backend())
+    raw = ec.derive_private_key(value, _curve, _backend)
     return private_key(raw)
 
 def private_key_from_int_hex(value):
     return private_key_from_int(int(value, 16))
 
 class public_key(object):
+    __slots__ = ('_public',)
 
     def __init__(self, public):
         self._public = public
 
     def _verify(self, signature, message, hash):
         try:
-            self._public.verify(signature, message, hash)
+            self._public.verify(as_bytes(signature), as_bytes(message), hash)
             return True
         except InvalidSignature:
             return False
 
     def verify_sha256(self, signature, message):
-        hash = ec.ECDSA(hashes.SHA256())
-        return self._verify(signature, message, hash)
+        return self._verify(signature, message, _ecdsa_sha256)
 
 class private_key(object):
+    __slots__ = ('_private',)
 
     def __init__(self, private):
         self._private = private
 
     def _sign(self, message, hash):
-        return self._private.sign(message, hash)
+        return self._private.sign(as_bytes(message), hash)
 
     def sign_sha256(self, message):
-        hash = ec.ECDSA(hashes.SHA256())
-        return self._sign(message, hash)
+        return self._sign(message, _ecdsa_sha256)
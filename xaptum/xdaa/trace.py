@@ -0,0 +1,132 @@
+# Copyright 2017 Xaptum, Inc.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License");
+#    you may not use this file except in compliance with the License.
+#    You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS,
+#    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    See the License for the specific language governing permissions and
+#    limitations under the License
+
+
+from __future__ import absolute_import, division, print_function
+
+import bisect
+import threading
+
+from xaptum.xdaa.util import monotonic
+
+# Handshake phases, in the order they occur
+TCP_CONNECT         = 'tcp_connect'
+INITIALIZE          = 'initialize'
+CLIENT_HELLO        = 'client_hello'
+SERVER_KEY_EXCHANGE = 'server_key_exchange'
+VERIFY_SIGNATURE    = 'verify_signature'
+SIGN                = 'sign'
+CLIENT_KEY_EXCHANGE = 'client_key_exchange'
+COMPUTE_SHARED      = 'compute_shared'
+TLS_HANDSHAKE       = 'tls_handshake'
+
+class Tracer(object):
+    """Receives the duration of each handshake phase.
+
+    Pass an instance as *tracer* to *negotiate_secret* or
+    *xaptum.client.connect*. *phase* is called on the connecting thread once
+    per phase with the phase name, its duration in seconds on the monotonic
+    clock, and the bytes sent and received during it.
+
+    """
+
+    def phase(self, name, duration, sent=0, received=0):
+        pass
+
+def trace(tracer, name, start, sent=0, received=0):
+    """Reports the phase that began at *start* to *tracer* and returns the
+    current time, which is the start of the next phase.
+
+    """
+    now = monotonic()
+    tracer.phase(name, now - start, sent, received)
+    return now
+
+default_buckets = (0.0001, 0.00025, 0.0005,
+                   0.001,  0.0025,  0.005,
+                   0.01,   0.025,   0.05,
+                   0.1,    0.25,    0.5,
+                   1.0,    2.5,     5.0,
+                   10.0)
+
+class phase_stats(object):
+    __slots__ = ('count', 'total', 'sent', 'received', 'buckets')
+
+    def __init__(self, nbuckets):
+        self.count = 0
+        self.total = 0.0
+        self.sent = 0
+        self.received = 0
+        self.buckets = [0] * nbuckets
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+class HistogramTracer(Tracer):
+    """A *Tracer* that keeps a latency histogram and byte counts per phase."""
+
+    def __init__(self, buckets=default_buckets):
+        self.bounds = tuple(buckets)
+        self._phases = {}
+        self._lock = threading.Lock()
+
+    def phase(self, name, duration, sent=0, received=0):
+        index = bisect.bisect_left(self.bounds, duration)
+        with self._lock:
+            stats = self._phases.get(name)
+            if stats is None:
+                stats = self._phases[name] = phase_stats(len(self.bounds) + 1)
+            stats.count += 1
+            stats.total += duration
+            stats.sent += sent
+            stats.received += received
+            stats.buckets[index] += 1
+
+    def phases(self):
+        with self._lock:
+            return list(self._phases)
+
+    def stats(self, name):
+        return self._phases.get(name)
+
+    def quantile(self, name, q):
+        """Returns the upper bound of the bucket holding the *q* quantile of
+        *name*, or None if nothing was recorded. Durations beyond the last bound
+        report infinity.
+
+        """
+        stats = self._phases.get(name)
+        if stats is None or stats.count == 0:
+            return None
+        rank = q * stats.count
+        seen = 0
+        for (index, count) in enumerate(stats.buckets):
+            seen += count
+            if seen >= rank and count:
+                return self.bounds[index] if index < len(self.bounds) else float('inf')
+        return float('inf')
+
+    def summary(self):
+        """Returns {phase: {count, mean, p50, p99, sent, received}}."""
+        result = {}
+        for name in self.phases():
+            stats = self._phases[name]
+            result[name] = {'count'    : stats.count,
+                            'mean'     : stats.mean,
+                            'p50'      : self.quantile(name, 0.50),
+                            'p99'      : self.quantile(name, 0.99),
+                            'sent'     : stats.sent,
+                            'received' : stats.received}
+        return result
@@ -15,22 +15,121 @@
 from __future__ import absolute_import
 
 import socket
+import threading
+
+from collections import OrderedDict
+
+try:
+    from time import monotonic
+except ImportError:
+    from time import time as monotonic
 
 def recvexactly(sock, size, flags=0):
     """Receive exactly size bytes from the socket.
 
     The return value is a bytes object representing the data received. See the
     Unix manual page recv(2) for the meaning of the optional argument *flags*;
-    it defaults to zero.
+    it defaults to zero. Use *recvexactly_into* to receive without the copy.
 
     """
 
     buffer = bytearray(size)
+    if not recvexactly_into(sock, buffer, flags):
+        return bytes(b'')
+    return bytes(buffer)
+
+def recvexactly_into(sock, buffer, flags=0, deadline=None):
+    """Receive exactly len(buffer) bytes from the socket into *buffer*.
+
+    Returns False if the socket was closed before *buffer* was filled and True
+    otherwise. If *deadline* is given, as a *monotonic* time, each partial read
+    is bounded by the time remaining and *socket.timeout* is raised once it has
+    passed. The socket's timeout is left changed in that case.
+
+    """
+
     view = memoryview(buffer)
+    size = len(view)
     pos = 0
     while pos < size:
+        if deadline is not None:
+            sock.settimeout(remaining(deadline))
         read = sock.recv_into(view[pos:], size - pos, flags)
         if read == 0:
-            return bytes(b'')
+            return False
         pos += read
-    return bytes(buffer)
+    return True
+
+def sendall(sock, data, deadline=None):
+    """Sends all of *data*, raising *socket.timeout* if *deadline* passes first."""
+    if deadline is None:
+        sock.sendall(data)
+        return
+    view = memoryview(data)
+    while len(view):
+        sock.settimeout(remaining(deadline))
+        view = view[sock.send(view):]
+
+def set_nodelay(sock):
+    """Disables Nagle's algorithm on the TCP socket *sock*.
+
+    The handshakes send several small messages back to back. Nagle holds each
+    one until the previous is acknowledged, and the peer's delayed ACK then
+    stalls the exchange by around 40 ms.
+
+    """
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+def remaining(deadline):
+    """Returns the seconds left until the *monotonic* time *deadline*, raising
+    *socket.timeout* if it has passed.
+
+    """
+    left = deadline - monotonic()
+    if left <= 0:
+        raise socket.timeout("timed out")
+    return left
+
+def as_bytes(data):
+    """Returns the bytes-like object *data* as a bytes object."""
+    if isinstance(data, bytes):
+        return data
+    if isinstance(data, memoryview):
+        return data.tobytes()
+    return bytes(data)
+
+class lru_cache(object):
+    """A thread-safe mapping that computes missing values with *load* and keeps
+    at most *max_size* of the most recently used entries.
+
+    """
+
+    def __init__(self, load, max_size):
+        self._load = load
+        self._max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            try:
+                value = self._entries.pop(key)
+                self._entries[key] = value
+                return value
+            except KeyError:
+                pass
+
+        value = self._load(key)
+
+        with self._lock:
+            self._entries[key] = value
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
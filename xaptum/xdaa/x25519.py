@@ -16,16 +16,19 @@ from __future__ import absolute_import, print_function
 
 import donna25519
 
+from xaptum.xdaa.util import as_bytes
+
 def public_key_from_bytes_le(bytes_le):
     raw = donna25519.keys.PublicKey(bytes_le)
     return public_key(raw)
     
 def public_key_from_bytes_be(bytes_be):
-    bytes_le = bytes_be[::-1]
+    bytes_le = as_bytes(bytes_be)[::-1]
     return public_key_from_bytes_le(bytes_le)
 
 class public_key(object):
- 
+    __slots__ = ('_public',)
+
     def __init__(self, public):
         self._public = public
 
@@ -36,6 +39,7 @@ class public_key(object):
         return self.to_bytes_le()[::-1]
         
 class key_pair(object):
+    __slots__ = ('_private', '_public')
 
     def __init__(self):
         self._private = donna25519.keys.PrivateKey()
@@ -15,56 +15,251 @@
 from __future__ import absolute_import, print_function
 
 import os
+import socket
 import struct
 
 from collections import namedtuple
 from xaptum.xdaa import secp256r1
+from xaptum.xdaa import trace
 from xaptum.xdaa import x25519
 from xaptum.xdaa import util
+from xaptum.xdaa.errors import (XDAAError,
+                                XDAAIncorrectGroupError,
+                                XDAAInvalidSignatureError,
+                                XDAASocketClosedError,
+                                XDAATimeoutError,
+                                XDAAUnsupportedVersionError)
+
+def negotiate_secret(sock, group, key_pool=None, tracer=None, timeout=None):
+    """Performs the XDAA handshake on the given socket and returns the negotiated
+    shared secret.
 
-class XDAAError(Exception):
-    pass
+    *group* is either a *daa_group* or its encoded 'id,public,private' string.
+    If *key_pool* is given, the ephemeral key pair and nonce are taken from
+    that *EphemeralKeyPool* instead of being generated here. If *tracer* is
+    given, each phase of the handshake is reported to that *trace.Tracer*.
+    If *timeout* is given, the whole handshake must finish within that many
+    seconds.
 
-class XDAAIncorrectGroupError(XDAAError):
-    pass
+    Raises *socket.error* on underlying socket errors, *xdaa.XDAATimeoutError*
+    if the timeout passes, and *xdaa.XDAAError* on other handshake errors.
 
-class XDAAInvalidSignatureError(XDAAError):
-    pass
+    """
+    deadline = None if timeout is None else util.monotonic() + timeout
+    handshake = client_handshake(group, key_pool=key_pool, tracer=tracer)
+    previous = sock.gettimeout()
+    try:
+        # ClientHello
+        try:
+            util.sendall(sock, handshake.start(), deadline)
+        except socket.timeout:
+            raise XDAATimeoutError("Timed out sending ClientHello", trace.CLIENT_HELLO)
+
+        return complete_handshake(sock, handshake, deadline)
+    finally:
+        if deadline is not None:
+            sock.settimeout(previous)
+
+def complete_handshake(sock, handshake, deadline=None):
+    """Finishes a *client_handshake* whose ClientHello has already been sent on
+    the given socket, e.g. in the SYN with TCP Fast Open, and returns the
+    negotiated shared secret.
+
+    If *deadline* is given, as a *util.monotonic* time, every read and write
+    is bounded by the time remaining until then. The socket's timeout is left
+    changed; callers restore it.
+
+    Raises *socket.error* on underlying socket errors, *xdaa.XDAATimeoutError*
+    if the deadline passes, and *xdaa.XDAAError* on other handshake errors.
 
-class XDAASocketClosedError(XDAAError):
-    pass
+    """
+    # ServerKeyExchange, answered by the ClientKeyExchange
+    while not handshake.done:
+        buf = bytearray(handshake.bytes_needed)
+        try:
+            if not util.recvexactly_into(sock, buf, deadline=deadline):
+                raise XDAASocketClosedError("Socket closed while reading ServerKeyExchange")
+        except socket.timeout:
+            raise XDAATimeoutError("Timed out reading ServerKeyExchange", trace.SERVER_KEY_EXCHANGE)
+        out = handshake.receive_data(buf)
+        if out:
+            try:
+                util.sendall(sock, out, deadline)
+            except socket.timeout:
+                raise XDAATimeoutError("Timed out sending ClientKeyExchange",
+                                       trace.CLIENT_KEY_EXCHANGE)
 
-class XDAAUnsupportedVersionError(XDAAError):
-    pass
+    # Done
+    return handshake.shared_secret
 
-def negotiate_secret(sock, group):
-    """Performs the XDAA handshake on the given socket and returns the negotiated
-    shared secret.
+class client_handshake(object):
+    """The client side of the XDAA handshake as a sans-I/O state machine.
+
+    The caller owns the socket. Send the bytes returned by *start*, then pass
+    everything received to *receive_data* and send whatever it returns, until
+    *done* is set and *shared_secret* holds the result. *bytes_needed* is the
+    number of bytes required to make progress, so blocking callers can read
+    exactly that much and skip the internal buffering.
+
+    Once *done*, the handshake drops its ephemeral keys, nonces and buffers so
+    that only *shared_secret* remains.
+
+    Raises *xdaa.XDAAError* on handshake errors.
+
+    """
+    __slots__ = ('tracer', 'done', 'shared_secret',
+                 '_mark', '_client', '_server', '_msg', '_pending')
+
+    def __init__(self, group, key_pool=None, tracer=None):
+        self.tracer = tracer
+        if tracer is not None:
+            self._mark = util.monotonic()
+
+        # Initialize parameters
+        group = parse_group(group)
+        self._client = client_params.initialize(group, key_pool)
+        self._server = server_params.initialize(group)
+        self._msg = None
+        self._pending = bytearray()
+        self.done = False
+        self.shared_secret = None
+        if tracer is not None:
+            self._mark = trace.trace(tracer, trace.INITIALIZE, self._mark)
+
+    @property
+    def bytes_needed(self):
+        if self.done:
+            return 0
+        if self._msg is None:
+            return server_key_exchange.header_len - len(self._pending)
+        return self._msg.body_len - len(self._pending)
+
+    def start(self):
+        """Returns the ClientHello to send."""
+        buf = client_hello.build_from_params(self._client).buffer
+        if self.tracer is not None:
+            self._mark = trace.trace(self.tracer, trace.CLIENT_HELLO, self._mark, sent=len(buf))
+        return buf
+
+    def receive_data(self, data):
+        """Consumes bytes received from the server and returns the bytes to send
+        in reply, which may be empty.
+
+        """
+        view = memoryview(data)
+        while len(view):
+            if self.done:
+                raise XDAAError("Unexpected data after ServerKeyExchange")
+            needed = self.bytes_needed
+            if not self._pending and len(view) >= needed:
+                chunk = view[:needed]
+                view = view[needed:]
+            else:
+                take = min(needed, len(view))
+                self._pending += view[:take]
+                view = view[take:]
+                if take < needed:
+                    break
+                chunk = self._pending
+                self._pending = bytearray()
+
+            if self._msg is None:
+                self._msg = server_key_exchange.parse_header(chunk)
+                if self._msg.body_len:
+                    continue
+            msg = self._msg.parse_body(chunk)
+            out = self._finish(msg)
+            if len(view):
+                raise XDAAError("Unexpected data after ServerKeyExchange")
+            return out
+        return b''
+
+    def _finish(self, msg):
+        tracer = self.tracer
+        client = self._client
+        if tracer is not None:
+            self._mark = trace.trace(tracer, trace.SERVER_KEY_EXCHANGE, self._mark,
+                                     received=msg.header_len + msg.body_len)
+
+        check_server_key_exchange(msg, client, self._server)
+        server = msg.add_params_to(self._server)
+        if tracer is not None:
+            self._mark = trace.trace(tracer, trace.VERIFY_SIGNATURE, self._mark)
+
+        # ClientKeyExchange
+        msg = client_key_exchange.build_from_params(client, server)
+        if tracer is not None:
+            self._mark = trace.trace(tracer, trace.SIGN, self._mark)
+
+        buf = msg.buffer
+        if tracer is not None:
+            self._mark = trace.trace(tracer, trace.CLIENT_KEY_EXCHANGE, self._mark, sent=len(buf))
+
+        # Compute shared secret
+        self.shared_secret = client.ephemeral.compute_shared(server.ephemeral_public)[::-1]
+        if tracer is not None:
+            trace.trace(tracer, trace.COMPUTE_SHARED, self._mark)
+
+        self.done = True
+        self._release()
+        return buf
+
+    def _release(self):
+        self._client = None
+        self._server = None
+        self._msg = None
+        self._pending = None
+
+def accept_secret(sock, group, key_pool=None):
+    """Performs the server side of the XDAA handshake on the given socket and
+    returns the negotiated shared secret.
+
+    *group* must include the DAA group private key. This is intended for
+    stand-in servers in tests and benchmarks, not as a replacement for the ENF.
 
     Raises *socket.error* on underlying socket errors and *xdaa.XDAAError* on
     handshake errors.
 
     """
     # Initialize parameters
-    group = daa_group.from_encoded(group)
-    client = client_params.initialize(group)
-    server = server_params.initialize(group)
+    group = parse_group(group)
+    server = client_params.initialize(group, key_pool)
 
     # ClientHello
-    msg = client_hello.build_from_params(client)
-    sock.sendall(msg.buffer)
+    hello = _recv_message(sock, client_hello, "ClientHello")
+
+    if hello.version != 0:
+        raise XDAAUnsupportedVersionError("ClientHello has version %d. Only version 0 is supported."%
+                                          hello.version)
+    if hello.group_id != group.id:
+        raise XDAAIncorrectGroupError("ClientHello has incorrect DAA group.")
 
     # ServerKeyExchange
-    buf = util.recvexactly(sock, server_key_exchange.header_len)
-    if buf == "":
-        raise XDAASocketClosedError("Socket closed while reading ServerKeyExchange")
-    msg = server_key_exchange.parse_header(buf)
+    msg = server_key_exchange.build_from_params(server, hello)
+    sock.sendall(msg.buffer)
+
+    # ClientKeyExchange
+    msg = _recv_message(sock, client_key_exchange, "ClientKeyExchange")
+
+    if msg.version != 0:
+        raise XDAAUnsupportedVersionError("ClientKeyExchange has version %d. Only version 0 is supported."%
+                                          msg.version)
+    if not msg.verify_signature(server):
+        raise XDAAInvalidSignatureError("ClientKeyExchange signature is invalid")
+
+    # Compute shared secret
+    peer = x25519.public_key_from_bytes_be(msg.ecdhe_public_key)
+    shared_secret = server.ephemeral.compute_shared(peer)[::-1]
+
+    # Done
+    return shared_secret
 
-    buf = util.recvexactly(sock, msg.body_len)
-    if buf == "":
-        raise XDAASocketClosedError("Socket closed while reading ServerKeyExchange")
-    msg = msg.parse_body(buf)
+def check_server_key_exchange(msg, client, server):
+    """Validates a parsed ServerKeyExchange against the handshake parameters.
 
+    Raises *xdaa.XDAAError* if the message is not acceptable.
+
+    """
     if msg.version != 0:
         raise XDAAUnsupportedVersionError("ServerKeyExchange has version %d. Only version 0 is supported."%
                                           msg.version)
@@ -73,19 +268,8 @@ def negotiate_secret(sock, group):
     if not msg.verify_signature(client, server):
         raise XDAAInvalidSignatureError("ServerKeyExchange signature is invalid")
 
-    server = msg.add_params_to(server)
-
-    # ClientKeyExchange
-    msg = client_key_exchange.build_from_params(client, server)
-    sock.sendall(msg.buffer)
-
-    # Compute shared secret
-    shared_secret = client.ephemeral.compute_shared(server.ephemeral_public)[::-1]
-    
-    # Done
-    return shared_secret
-
 class daa_group(object):
+    __slots__ = ('id', 'public', 'private')
 
     @staticmethod
     def from_encoded(encoded):
@@ -99,6 +283,22 @@ class daa_group(object):
         self.public = public
         self.private = private
 
+group_cache_size = 64
+
+_group_cache = util.lru_cache(daa_group.from_encoded, group_cache_size)
+
+def parse_group(group):
+    """Returns the *daa_group* for *group*, which may be a *daa_group* or its
+    encoded string.
+
+    Encoded groups are parsed once and then served from a bounded LRU cache, so
+    reconnecting with the same group string skips the key derivation.
+
+    """
+    if isinstance(group, daa_group):
+        return group
+    return _group_cache.get(group)
+
 class client_params(namedtuple('client_params', ['version',
                                                  'group',
                                                  'nonce',
@@ -106,12 +306,17 @@ class client_params(namedtuple('client_params', ['version',
     __slots__ = ()
 
     @staticmethod
-    def initialize(group):
-        nonce_len = 32
+    def initialize(group, key_pool=None):
+        if key_pool is None:
+            nonce_len = 32
+            nonce     = os.urandom(nonce_len)
+            ephemeral = x25519.key_pair()
+        else:
+            (nonce, ephemeral) = key_pool.take()
         return client_params(0,
                              group,
-                             os.urandom(nonce_len),
-                             x25519.key_pair())
+                             nonce,
+                             ephemeral)
 
 
 class server_params(namedtuple('server_params', ['version',
@@ -135,6 +340,13 @@ class client_hello(namedtuple('client_hello', ['version',
                                                'nonce'])):
     __slots__ = ()
 
+    _header    = struct.Struct('!BHH')
+    header_len = _header.size
+
+    @property
+    def body_len(self):
+        return self.group_id_len + self.nonce_len
+
     @staticmethod
     def build_from_params(client):
         return client_hello(client.version,
@@ -143,16 +355,39 @@ class client_hello(namedtuple('client_hello', ['version',
                             client.group.id,
                             client.nonce)
 
+    @staticmethod
+    def parse_header(header):
+        (version,
+         group_id_len,
+         nonce_len) = client_hello._header.unpack_from(header)
+        return client_hello(version,
+                            group_id_len,
+                            nonce_len,
+                            None,
+                            None)
+
+    def parse_body(self, body):
+        (group_id,
+         nonce) = _split(body, self.group_id_len,
+                               self.nonce_len)
+        return self._replace(group_id = _decode_group_id(group_id),
+                             nonce    = nonce)
+
+    def write_into(self, buf, offset=0):
+        self._header.pack_into(buf, offset,
+                               self.version,
+                               self.group_id_len,
+                               self.nonce_len)
+        offset += self.header_len
+        offset = _put(buf, offset, self.group_id.encode('ascii'))
+        offset = _put(buf, offset, self.nonce)
+        return offset
+
     @property
     def buffer(self):
-        format = '!BHH%ds%ds'%(self.group_id_len,
-                               self.nonce_len)
-        return struct.pack(format,
-                           self.version,
-                           self.group_id_len,
-                           self.nonce_len,
-                           self.group_id.encode('ascii'),
-                           self.nonce)
+        buf = bytearray(self.header_len + self.body_len)
+        self.write_into(buf)
+        return buf
 
 class server_key_exchange(namedtuple('server_key_exchange', ['version',
                                                              'group_id_len',
@@ -165,21 +400,40 @@ class server_key_exchange(namedtuple('server_key_exchange', ['version',
                                                              'signature'])):
     __slots__ = ()
 
-    header_len = 1 + 2 + 2 + 2 + 2
+    _header    = struct.Struct('!BHHHH')
+    header_len = _header.size
 
     @property
     def body_len(self):
         return sum([self.group_id_len, self.nonce_len,
                     self.ecdhe_public_key_len, self.signature_len])
-    
+
+    @staticmethod
+    def build_from_params(server, hello):
+        """Builds the ServerKeyExchange for a stand-in server, whose own nonce
+        and ephemeral key pair are carried in a *client_params*.
+
+        """
+        key = server.ephemeral.public.to_bytes_be()
+        sig = server.group.private.sign_sha256(_concat(key, hello.nonce))
+
+        return server_key_exchange(server.version,
+                                   len(server.group.id),
+                                   len(server.nonce),
+                                   len(key),
+                                   len(sig),
+                                   server.group.id,
+                                   server.nonce,
+                                   key,
+                                   sig)
+
     @staticmethod
     def parse_header(header):
-        format = '!BHHHH'
         (version,
          group_id_len,
          nonce_len,
          ecdhe_public_key_len,
-         signature_len) = struct.unpack(format, header)
+         signature_len) = server_key_exchange._header.unpack_from(header)
         return server_key_exchange(version,
                                    group_id_len,
                                    nonce_len,
@@ -191,49 +445,47 @@ class server_key_exchange(namedtuple('server_key_exchange', ['version',
                                    None)
 
     def parse_body(self, body):
-        format = '!%ds%ds%ds%ds'%(self.group_id_len,
-                                  self.nonce_len,
-                                  self.ecdhe_public_key_len,
-                                  self.signature_len)
         (group_id,
          nonce,
          ecdhe_public_key,
-         signature) = struct.unpack(format, body)
-        return self._replace(group_id         = group_id.decode('ascii'),
+         signature) = _split(body, self.group_id_len,
+                                   self.nonce_len,
+                                   self.ecdhe_public_key_len,
+                                   self.signature_len)
+        return self._replace(group_id         = _decode_group_id(group_id),
                              nonce            = nonce,
                              ecdhe_public_key = ecdhe_public_key,
                              signature        = signature)
 
     def verify_signature(self, client, server):
-        key = self.ecdhe_public_key
-        sig_format = '!%ds%ds'%(len(key),
-                                len(client.nonce))
-        sig_buffer = struct.pack(sig_format,
-                                 key,
-                                 client.nonce)
+        sig_buffer = _concat(self.ecdhe_public_key, client.nonce)
         return server.group.public.verify_sha256(self.signature, sig_buffer)
-    
+
     def add_params_to(self, server):
         ephemeral = x25519.public_key_from_bytes_be(self.ecdhe_public_key)
         return server._replace(version          = self.version,
                                nonce            = self.nonce,
                                ephemeral_public = ephemeral)
-    
+
+    def write_into(self, buf, offset=0):
+        self._header.pack_into(buf, offset,
+                               self.version,
+                               self.group_id_len,
+                               self.nonce_len,
+                               self.ecdhe_public_key_len,
+                               self.signature_len)
+        offset += self.header_len
+        offset = _put(buf, offset, self.group_id.encode('ascii'))
+        offset = _put(buf, offset, self.nonce)
+        offset = _put(buf, offset, self.ecdhe_public_key)
+        offset = _put(buf, offset, self.signature)
+        return offset
+
     @property
     def buffer(self):
-        format = '!BHHHH%ds%ds%ds%ds'%(self.group_id_len,
-                                       self.nonce_len,
-                                       self.ecdhe_public_key_len,
-                                       self.signature_len)
-        return struct.pack(format,
-                           self.group_id_len,
-                           self.nonce_len,
-                           self.ecdhe_public_key_len,
-                           self.signature_len,
-                           self.group_id.encode('ascii'),
-                           self.nonce,
-                           self.ecdhe_public_key,
-                           self.signature)
+        buf = bytearray(self.header_len + self.body_len)
+        self.write_into(buf)
+        return buf
 
 class client_key_exchange(namedtuple('client_key_exchange', ['version',
                                                              'ecdhe_public_key_len',
@@ -242,15 +494,17 @@ class client_key_exchange(namedtuple('client_key_exchange', ['version',
                                                              'signature'])):
     __slots__ = ()
 
+    _header    = struct.Struct('!BHH')
+    header_len = _header.size
+
+    @property
+    def body_len(self):
+        return self.ecdhe_public_key_len + self.signature_len
+
     @staticmethod
     def build_from_params(client, server):
         key = client.ephemeral.public.to_bytes_be()
-        sig_format = '!%ds%ds'%(len(key),
-                                len(server.nonce))
-        sig_buffer = struct.pack(sig_format,
-                                 key,
-                                 server.nonce)
-        sig = client.group.private.sign_sha256(sig_buffer)
+        sig = client.group.private.sign_sha256(_concat(key, server.nonce))
 
         return client_key_exchange(client.version,
                                    len(key),
@@ -258,13 +512,87 @@ class client_key_exchange(namedtuple('client_key_exchange', ['version',
                                    key,
                                    sig)
 
+    @staticmethod
+    def parse_header(header):
+        (version,
+         ecdhe_public_key_len,
+         signature_len) = client_key_exchange._header.unpack_from(header)
+        return client_key_exchange(version,
+                                   ecdhe_public_key_len,
+                                   signature_len,
+                                   None,
+                                   None)
+
+    def parse_body(self, body):
+        (ecdhe_public_key,
+         signature) = _split(body, self.ecdhe_public_key_len,
+                                   self.signature_len)
+        return self._replace(ecdhe_public_key = ecdhe_public_key,
+                             signature        = signature)
+
+    def verify_signature(self, server):
+        sig_buffer = _concat(self.ecdhe_public_key, server.nonce)
+        return server.group.public.verify_sha256(self.signature, sig_buffer)
+
+    def write_into(self, buf, offset=0):
+        self._header.pack_into(buf, offset,
+                               self.version,
+                               self.ecdhe_public_key_len,
+                               self.signature_len)
+        offset += self.header_len
+        offset = _put(buf, offset, self.ecdhe_public_key)
+        offset = _put(buf, offset, self.signature)
+        return offset
+
     @property
     def buffer(self):
-        format = '!BHH%ds%ds'%(self.ecdhe_public_key_len,
-                               self.signature_len)
-        return struct.pack(format,
-                           self.version,
-                           self.ecdhe_public_key_len,
-                           self.signature_len,
-                           self.ecdhe_public_key,
-                           self.signature)
+        buf = bytearray(self.header_len + self.body_len)
+        self.write_into(buf)
+        return buf
+
+def _decode_group_id(group_id):
+    try:
+        return group_id.tobytes().decode('ascii')
+    except UnicodeDecodeError:
+        raise XDAAError("Group id is not ASCII")
+
+def _split(body, *lengths):
+    """Splits *body* into consecutive memoryview fields of the given lengths,
+    without copying.
+
+    """
+    view = memoryview(body)
+    if len(view) < sum(lengths):
+        raise XDAAError("Message body is %d bytes, expected %d"%(len(view), sum(lengths)))
+    fields = []
+    pos = 0
+    for length in lengths:
+        fields.append(view[pos:pos + length])
+        pos += length
+    return fields
+
+def _put(buf, offset, data):
+    end = offset + len(data)
+    buf[offset:end] = data
+    return end
+
+def _concat(*parts):
+    buf = bytearray()
+    for part in parts:
+        buf += part
+    return buf
+
+def _recv_message(sock, cls, name):
+    """Reads one *cls* message from *sock* and returns it parsed, with memoryview
+    fields into the receive buffer.
+
+    """
+    header = bytearray(cls.header_len)
+    if not util.recvexactly_into(sock, header):
+        raise XDAASocketClosedError("Socket closed while reading %s"%name)
+    msg = cls.parse_header(header)
+
+    body = bytearray(msg.body_len)
+    if not util.recvexactly_into(sock, body):
+        raise XDAASocketClosedError("Socket closed while reading %s"%name)
+    return msg.parse_body(body)